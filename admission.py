@@ -0,0 +1,282 @@
+"""Admission control for the Gemini-backed API endpoints.
+
+Every /api/generate*, /api/chat* and POST /api/jobs request passes two
+checks before any work is done:
+
+* a token bucket per client (X-API-Key if sent, otherwise the client IP) and
+  tool class: ``chat`` (chat modes), ``long`` (long-form tools such as blog
+  and docs) and ``short`` (everything else)
+* a global cap on in-flight requests, sized to the upstream Gemini quota;
+  queued jobs take a lease from it too while they run (see ``acquire``)
+
+Rejected requests get an immediate 429 with Retry-After instead of queueing
+into a timeout. A request that costs more than its bucket's burst (a batch
+with more long-form items than RATE_LIMIT_LONG allows) could never be
+admitted, so it gets a 413 stating the limit instead. Buckets and in-flight leases live in a SQLite file
+(RATE_LIMIT_DB) so every gunicorn worker on the host shares them; set
+RATE_LIMIT_DB to an empty string to keep state per process instead.
+
+Bucket budgets are "<burst>/<seconds>", e.g. RATE_LIMIT_LONG=5/60 allows a
+burst of 5 long-form requests, refilled at 5 per minute.
+"""
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, jsonify, request
+
+from sqlite_db import Database
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+DB_PATH = os.getenv("RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "qwickgen-admission.db"))
+MAX_IN_FLIGHT = int(os.getenv("GLOBAL_MAX_IN_FLIGHT", "50"))
+LEASE_TTL = float(os.getenv("ADMISSION_LEASE_TTL", "180"))
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+LONG_TOOLS = set(os.getenv(
+    "LONG_FORM_TOOLS", "blog,docs,api_builder,planner,research,assignment"
+).split(","))
+GUARDED_PREFIXES = ("/api/generate", "/api/chat", "/api/jobs")
+
+
+def _parse_budget(value: str):
+    burst, seconds = value.split("/")
+    return float(burst), float(burst) / float(seconds)
+
+
+BUDGETS = {
+    "chat": _parse_budget(os.getenv("RATE_LIMIT_CHAT", "30/60")),
+    "short": _parse_budget(os.getenv("RATE_LIMIT_SHORT", "20/60")),
+    "long": _parse_budget(os.getenv("RATE_LIMIT_LONG", "5/60")),
+}
+
+
+def tool_class(tool_id: str) -> str:
+    if (tool_id or "").startswith("chat_"):
+        return "chat"
+    if tool_id in LONG_TOOLS:
+        return "long"
+    return "short"
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._leases = {}
+
+    def take(self, charges: dict, now: float):
+        """Spend tokens for every ``(bucket_key, class): cost``, all or nothing.
+
+        Returns 0 on success, otherwise the seconds until enough tokens refill.
+        """
+        with self._lock:
+            updated, wait = _refill(charges, now, lambda key: self._buckets.get(key))
+            if wait == 0:
+                self._buckets.update(updated)
+            return wait
+
+    def acquire(self, count: int, now: float):
+        with self._lock:
+            self._leases = {k: v for k, v in self._leases.items() if v > now}
+            if len(self._leases) + count > MAX_IN_FLIGHT:
+                return None
+            ids = [uuid.uuid4().hex for _ in range(count)]
+            self._leases.update((lease, now + LEASE_TTL) for lease in ids)
+            return ids
+
+    def release(self, ids: list):
+        with self._lock:
+            for lease in ids:
+                self._leases.pop(lease, None)
+
+    def in_flight(self) -> int:
+        return len(self._leases)
+
+
+class SQLiteStore:
+    def __init__(self, path: str):
+        self.db = Database(
+            path,
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, expires REAL NOT NULL)",
+        )
+
+    def take(self, charges: dict, now: float):
+        with self.db.transaction() as conn:
+            def load(key):
+                return conn.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+
+            updated, wait = _refill(charges, now, load)
+            if wait == 0:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens, stamp) for key, (tokens, stamp) in updated.items()],
+                )
+            return wait
+
+    def acquire(self, count: int, now: float):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+            (active,) = conn.execute("SELECT COUNT(*) FROM leases").fetchone()
+            if active + count > MAX_IN_FLIGHT:
+                return None
+            ids = [uuid.uuid4().hex for _ in range(count)]
+            conn.executemany(
+                "INSERT INTO leases (id, expires) VALUES (?, ?)",
+                [(lease, now + LEASE_TTL) for lease in ids],
+            )
+            return ids
+
+    def release(self, ids: list):
+        self.db.executemany("DELETE FROM leases WHERE id = ?", [(lease,) for lease in ids])
+
+    def in_flight(self) -> int:
+        [(active,)] = self.db.execute("SELECT COUNT(*) FROM leases WHERE expires > ?", (time.time(),))
+        return active
+
+
+def _refill(charges: dict, now: float, load):
+    updated = {}
+    wait = 0.0
+    for (key, cls), cost in charges.items():
+        burst, rate = BUDGETS[cls]
+        row = load(key)
+        if row is None:
+            tokens, stamp = burst, now
+        else:
+            # ``now`` was read before the store lock; another worker may have
+            # written a later stamp meanwhile, which must not drain the bucket.
+            stamp = max(now, row[1])
+            tokens = min(burst, row[0] + (stamp - row[1]) * rate)
+        if tokens < cost:
+            wait = max(wait, (cost - tokens) / rate)
+        updated[key] = (tokens - cost, stamp)
+    return updated, wait
+
+
+_store = SQLiteStore(DB_PATH) if DB_PATH else MemoryStore()
+_rejected = Counter()
+
+
+def client_id() -> str:
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    route = request.access_route
+    if TRUSTED_PROXY_HOPS and len(route) >= TRUSTED_PROXY_HOPS:
+        return "ip:" + route[-TRUSTED_PROXY_HOPS]
+    return "ip:" + (request.remote_addr or "unknown")
+
+
+def _charges(data: dict) -> Counter:
+    if request.path.startswith("/api/chat"):
+        return Counter({"chat": 1})
+    items = data.get("items") if request.path == "/api/generate/batch" else [data]
+    if not isinstance(items, list):
+        return Counter({"short": 1})
+    return Counter(tool_class(item.get("tool")) for item in items if isinstance(item, dict))
+
+
+def _reject(reason: str, retry_after: float):
+    _rejected[reason] += 1
+    response = jsonify({
+        "success": False,
+        "error": "Too many requests. Please slow down and try again shortly.",
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _too_large(cls: str, cost: int, burst: float):
+    _rejected["too_large"] += 1
+    response = jsonify({
+        "success": False,
+        "error": f"This request needs {cost} {cls} requests at once; the limit is {int(burst)}.",
+    })
+    response.status_code = 413
+    return response
+
+
+def _before_request():
+    if request.method != "POST" or not request.path.startswith(GUARDED_PREFIXES):
+        return None
+
+    data = request.get_json(force=True, silent=True)
+    charges = _charges(data if isinstance(data, dict) else {})
+    if not charges:
+        return None
+
+    for cls, cost in charges.items():
+        burst = BUDGETS[cls][0]
+        if cost > burst:
+            return _too_large(cls, cost, burst)
+
+    now = time.time()
+    client = client_id()
+    wait = _store.take({(f"{client}:{cls}", cls): cost for cls, cost in charges.items()}, now)
+    if wait:
+        return _reject("rate_limited", wait)
+
+    leases = _store.acquire(min(sum(charges.values()), MAX_IN_FLIGHT), now)
+    if leases is None:
+        return _reject("over_capacity", 1)
+    g.admission_leases = leases
+    return None
+
+
+def _after_request(response):
+    # Teardown runs as soon as the view returns, before a streamed body is
+    # sent, so a stream keeps its leases until the server closes it.
+    leases = g.get("admission_leases")
+    if leases and response.is_streamed:
+        g.admission_leases = None
+        response.call_on_close(lambda: _store.release(leases))
+    return response
+
+
+def _teardown_request(exc):
+    leases = g.pop("admission_leases", None)
+    if leases:
+        _store.release(leases)
+
+
+def acquire(count: int = 1):
+    """Take in-flight leases for work outside a request, such as a job.
+
+    Returns the lease ids (empty when admission is off), or None while the
+    global cap is full.
+    """
+    if not ENABLED:
+        return []
+    return _store.acquire(min(count, MAX_IN_FLIGHT), time.time())
+
+
+def release(leases: list):
+    if leases:
+        _store.release(leases)
+
+
+def init_app(app):
+    if ENABLED:
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        app.teardown_request(_teardown_request)
+
+
+def stats() -> dict:
+    return {
+        "enabled": ENABLED,
+        "shared": isinstance(_store, SQLiteStore),
+        "in_flight": _store.in_flight(),
+        "max_in_flight": MAX_IN_FLIGHT,
+        "rejected": dict(_rejected),
+    }
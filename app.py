@@ -1,12 +1,28 @@
 import logging
 import os
 import requests
-from flask import Flask, request, jsonify, send_from_directory, redirect
+from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
 
-logging.basicConfig(level=logging.INFO)
-
-app = Flask(__name__, static_folder='.')
+import admission
+import batch
+import chat_context
+import chat_sessions
+import gemini_client
+import health
+import jobs
+import log_config
+import metrics
+import prompts
+import resilience
+import response_cache
+import singleflight
+import static_assets
+import streaming
+
+log_config.configure()
+
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.getenv("SESSION_SECRET", "dev-secret-key")
 CORS(app)
 
@@ -15,168 +31,106 @@ if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in environment variables")
 
 # CHANGED: v1 -> v1beta
-GEMINI_URL = (
+# GEMINI_URL may point at a stand-in such as fake_gemini.py (see benchmark.py).
+GEMINI_URL = os.getenv("GEMINI_URL") or (
     "https://generativelanguage.googleapis.com/v1beta/models/"
     f"gemini-2.5-flash:generateContent?key={GOOGLE_API_KEY}"
 )
+health.start(GEMINI_URL)
 
 # ----------------------------
 # Prompt Templates
 # ----------------------------
-PROMPT_TEMPLATES = {
-    "hook": {
-        "system": "You are a viral content strategist who writes scroll-stopping hooks.",
-        "template": "Write 8 attention-grabbing hooks for content about: {input}\n\nReturn them as a numbered list. Each hook should be punchy, curiosity-driven, and under 20 words.",
-    },
-    "script": {
-        "system": "You are a professional scriptwriter for short-form video content.",
-        "template": "Write a complete short-form video script (60-90 seconds) on the topic: {input}\n\nStructure it with:\n- HOOK (first 3 seconds)\n- BODY (main points with visual cues)\n- CTA (call to action)\n\nKeep it engaging, conversational, and tight.",
-    },
-    "blog": {
-        "system": "You are an expert SEO blog writer.",
-        "template": "Write a complete, well-structured blog post about: {input}\n\nInclude:\n- A compelling title\n- An engaging introduction\n- 4-6 H2 sections with clear explanations\n- A conclusion with a takeaway\n\nAim for around 800 words. Use markdown formatting.",
-    },
-    "email": {
-        "system": "You are a professional copywriter who writes high-converting business emails.",
-        "template": "Write a professional email for the following purpose: {input}\n\nInclude a clear subject line, a friendly greeting, a focused body, and a strong call to action. Keep it concise.",
-    },
-    "idea": {
-        "system": "You are a creative strategist who generates fresh, actionable ideas.",
-        "template": "Generate 10 unique and creative ideas for: {input}\n\nFor each idea, give a short title and a 1-2 sentence explanation of why it works. Format as a numbered list.",
-    },
-    "tweet": {
-        "system": "You are a Twitter/X growth expert known for viral tweet hooks.",
-        "template": "Write 10 viral tweet hooks (under 280 characters each) about: {input}\n\nMix formats: bold claims, contrarian takes, listicles, questions, and stories. Number each one.",
-    },
-    "keyword": {
-        "system": "You are an SEO expert specializing in keyword research.",
-        "template": "Generate a comprehensive keyword list for the topic: {input}\n\nOrganize the output into:\n- 10 Primary keywords (high volume)\n- 10 Long-tail keywords (low competition)\n- 5 Question-based keywords\n\nFormat as clean lists.",
-    },
-    "title": {
-        "system": "You are an SEO copywriter who crafts click-worthy, ranking titles.",
-        "template": "Generate 10 SEO-optimized titles for an article about: {input}\n\nEach title should be under 60 characters, include the focus keyword naturally, and feel compelling. Number the list.",
-    },
-    "meta": {
-        "system": "You are an SEO specialist who writes meta descriptions that drive clicks.",
-        "template": "Write 5 SEO meta descriptions for: {input}\n\nEach must be 140-160 characters, include a clear value proposition and a soft CTA. Number them.",
-    },
-    "faq": {
-        "system": "You are an SEO content strategist who writes FAQ sections optimized for featured snippets.",
-        "template": "Generate 8 frequently asked questions and concise, accurate answers about: {input}\n\nFormat each as:\nQ: [question]\nA: [2-3 sentence answer]",
-    },
-    "yt_title": {
-        "system": "You are a YouTube growth expert who crafts high-CTR video titles.",
-        "template": "Generate 10 high-CTR YouTube video titles for content about: {input}\n\nEach title should be under 70 characters, use power words, and trigger curiosity. Mix listicles, how-tos, and bold claims. Number the list.",
-    },
-    "debug": {
-        "system": "You are a senior software engineer and expert code debugger.",
-        "template": "Analyze the following code, identify any bugs or issues, explain them clearly, and provide a corrected version:\n\n{input}",
-    },
-    "code_gen": {
-        "system": "You are an expert software engineer who writes clean, production-ready code.",
-        "template": "Write code for the following requirement:\n\n{input}\n\nReturn the complete, runnable code with brief inline comments where helpful.",
-    },
-    "explain": {
-        "system": "You are a programming teacher who explains code in clear, simple terms.",
-        "template": "Explain the following code step by step. Cover what it does, how it works, and any important concepts:\n\n{input}",
-    },
-    "convert": {
-        "system": "You are an expert polyglot programmer.",
-        "template": "Convert the following code to {target}. Preserve the logic exactly and follow idiomatic conventions of the target language:\n\n{input}",
-    },
-    "sql": {
-        "system": "You are a database expert who writes efficient, well-structured SQL queries.",
-        "template": "Write an SQL query for the following request:\n\n{input}\n\nReturn the query in a code block, then briefly explain what it does.",
-    },
-    "chat_general": {
-        "system": "You are a helpful, friendly, and knowledgeable AI assistant. Give clear, accurate, and concise responses.",
-        "template": "{input}",
-    },
-    "chat_emotional": {
-        "system": "You are a deeply empathetic and emotionally intelligent companion. Listen carefully, validate feelings, and respond with warmth and understanding. Never judge.",
-        "template": "{input}",
-    },
-    "chat_career": {
-        "system": "You are an experienced career coach. Give practical, actionable career guidance with structure. Ask thoughtful follow-up questions when needed.",
-        "template": "{input}",
-    },
-    "chat_mindfulness": {
-        "system": "You are a calm, grounded mindfulness guide. Speak gently, focus on the present moment, and offer simple breathing or grounding techniques when relevant.",
-        "template": "{input}",
-    },
-}
+PROMPT_TEMPLATES = prompts.load("tools")
+
+log_config.init_app(app)
+metrics.init_app(app, PROMPT_TEMPLATES)
+admission.init_app(app)
+static_files = static_assets.init_app(app)
 
 
 # ----------------------------
 # Gemini helper
 # ----------------------------
-def call_gemini(prompt: str, system_message: str = "You are a helpful AI assistant.") -> str:
+def build_payload(prompt: str, system_message: str = "You are a helpful AI assistant.", tool_id: str = None) -> dict:
+    # Search grounding and generationConfig are set per tool in prompt_templates.json.
+    return {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
+                    {
+                        "text": PROMPT_TEMPLATES.user_text(system_message, prompt)
+                    }
+                ]
+            }
+        ],
+        **PROMPT_TEMPLATES.options(tool_id)
+    }
+
+
+def call_gemini(
+    prompt: str,
+    system_message: str = "You are a helpful AI assistant.",
+    cache_key: str = None,
+    tool_id: str = None,
+) -> str:
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    return singleflight.do(
+        singleflight.prompt_key(prompt, system_message),
+        lambda: _call_gemini(prompt, system_message, cache_key, tool_id)
+    )
+
+
+def _call_gemini(prompt: str, system_message: str, cache_key: str = None, tool_id: str = None) -> str:
     try:
-        payload = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [
-                        {
-                            "text": f"{system_message}\n\nUser: {prompt}"
-                        }
-                    ]
-                }
-            ],
-            # CHANGED: Added Google Search grounding
-            "tools": [
-                {
-                    "google_search": {}
-                }
-            ]
-        }
+        payload = build_payload(prompt, system_message, tool_id)
 
-        response = requests.post(
-            GEMINI_URL,
-            json=payload,
-            timeout=60
-        )
+        with metrics.upstream(tool_id, payload) as call:
+            response = resilience.post(GEMINI_URL, payload, tool_id)
+            data = response.json()
+            call.finish(response.status_code, data.get("usageMetadata"), len(response.content))
 
-        data = response.json()
+        log_config.log_upstream(tool_id, response.status_code, call.duration, data)
 
-        logging.info("Gemini response status: %s", response.status_code)
-        logging.info("Gemini response body: %s", data)
+        if response.status_code == 429:
+            logging.warning("Gemini quota exhausted (HTTP 429)")
 
         if response.status_code != 200:
             if "error" in data:
                 return f"API Error: {data['error'].get('message', 'Unknown error')}"
             return f"API Error: HTTP {response.status_code}"
 
-        candidates = data.get("candidates", [])
-        if candidates:
-            content = candidates[0].get("content", {})
-            parts = content.get("parts", [])
-
-            texts = []
-            for part in parts:
-                if "text" in part:
-                    texts.append(part["text"])
-
-            if texts:
-                return "\n".join(texts)
+        text = gemini_client.candidate_text(data, "\n")
+        if text:
+            if cache_key:
+                response_cache.put(cache_key, text)
+            return text
 
         return "Sorry, I couldn't generate a response. Please try again."
 
+    except resilience.CircuitOpenError:
+        return "AI service is busy right now. Please try again in a few seconds."
+
     except requests.exceptions.Timeout:
         return "AI request timed out. Please try again."
 
     except requests.exceptions.RequestException as e:
         logging.exception("Gemini request error")
-        return f"Network error: {e}"
+        return f"Network error: {log_config.redact(str(e))}"
 
     except Exception as e:
         logging.exception("Gemini API error")
-        return f"AI service temporarily unavailable: {e}"
+        return f"AI service temporarily unavailable: {log_config.redact(str(e))}"
 
 
 @app.route("/")
 def index():
-    return send_from_directory(".", "ai-tools.html")
+    return static_files.send("ai-tools.html")
 
 
 @app.route("/ai-tools")
@@ -184,41 +138,57 @@ def ai_tools():
     return redirect("https://quickgenai.in/ai-tools")
 
 
+def build_generate_prompt(data: dict):
+    """Validate a /api/generate body and return (prompt, system, error)."""
+    tool_id = data.get("tool", "")
+    user_input = (data.get("input") or "").strip()
+    target = data.get("target", "Python")
+
+    if tool_id not in PROMPT_TEMPLATES:
+        return None, None, "Unknown tool"
+
+    if not user_input:
+        return None, None, "Please provide some input."
+
+    tpl = PROMPT_TEMPLATES[tool_id]
+    prompt = tpl.render(user_input, target)
+    return prompt, tpl.system, None
+
+
+def generate_cache_key(data: dict):
+    tool_id = data.get("tool", "")
+    return response_cache.template_key(
+        tool_id,
+        PROMPT_TEMPLATES[tool_id],
+        data.get("input") or "",
+        data.get("target", "Python")
+    )
+
+
+def generate_result(result: str) -> dict:
+    return {
+        "success": True,
+        "content": result,
+        "metadata": {
+            "answer": result
+        }
+    }
+
+
 @app.route("/api/generate", methods=["POST"])
 def generate():
     try:
         data = request.get_json(force=True)
-        tool_id = data.get("tool", "")
-        user_input = (data.get("input") or "").strip()
-        target = data.get("target", "Python")
-
-        if tool_id not in PROMPT_TEMPLATES:
+        prompt, system_prompt, error = build_generate_prompt(data)
+        if error:
             return jsonify({
                 "success": False,
-                "error": "Unknown tool"
+                "error": error
             }), 400
 
-        if not user_input:
-            return jsonify({
-                "success": False,
-                "error": "Please provide some input."
-            }), 400
+        result = call_gemini(prompt, system_prompt, generate_cache_key(data), data.get("tool"))
 
-        tpl = PROMPT_TEMPLATES[tool_id]
-        prompt = tpl["template"].format(
-            input=user_input,
-            target=target
-        )
-
-        result = call_gemini(prompt, tpl["system"])
-
-        return jsonify({
-            "success": True,
-            "content": result,
-            "metadata": {
-                "answer": result
-            }
-        })
+        return jsonify(generate_result(result))
 
     except Exception as e:
         logging.exception("Generation failed")
@@ -227,62 +197,246 @@ def generate():
             "error": str(e)
         }), 500
 
+def build_chat_prompt(data: dict):
+    """Validate a /api/chat body and return (conversation, system, session, pending, error).
+
+    ``session`` is None unless the client uses server-side sessions; then
+    ``pending`` goes back to ``session.record`` with the reply.
+    """
+    tool_id = data.get("tool", "chat_general")
+    message = (data.get("message") or "").strip()
+    history = data.get("history", [])
+
+    if tool_id not in PROMPT_TEMPLATES:
+        return None, None, None, None, "Unknown chatbot"
+
+    if not message:
+        return None, None, None, None, "Empty message"
+
+    system_prompt = PROMPT_TEMPLATES[tool_id].system
+
+    session = chat_sessions.open_session(data)
+    pending = None
+    if session:
+        conversation, pending = session.render(tool_id, message, bool(data.get("regenerate")))
+    else:
+        conversation = chat_context.build_conversation(tool_id, history, message)
+    return conversation, system_prompt, session, pending, None
+
+
+def chat_result(result: str, session=None) -> dict:
+    body = {
+        "success": True,
+        "response": result,
+        "metadata": {
+            "answer": result
+        }
+    }
+    if session:
+        body["session_id"] = session.id
+    return body
+
+
 @app.route("/api/chat", methods=["POST"])
 def chat():
     try:
         data = request.get_json(force=True)
-        tool_id = data.get("tool", "chat_general")
-        message = (data.get("message") or "").strip()
-        history = data.get("history", [])
+        conversation, system_prompt, session, pending, error = build_chat_prompt(data)
+        if error:
+            return jsonify({
+                "success": False,
+                "error": error
+            }), 400
+
+        result = call_gemini(conversation, system_prompt, tool_id=data.get("tool", "chat_general"))
+        if session:
+            session.record(pending, result)
+
+        return jsonify(chat_result(result, session))
+
+    except Exception as e:
+        logging.exception("Chat failed")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
 
-        if tool_id not in PROMPT_TEMPLATES:
+@app.route("/api/generate/stream", methods=["POST"])
+def generate_stream():
+    try:
+        data = request.get_json(force=True)
+        prompt, system_prompt, error = build_generate_prompt(data)
+        if error:
             return jsonify({
                 "success": False,
-                "error": "Unknown chatbot"
+                "error": error
             }), 400
 
-        if not message:
+        cache_key = generate_cache_key(data)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return streaming.sse_response(iter([cached]), generate_result)
+
+        tool_id = data.get("tool")
+        chunks = streaming.stream_gemini(GEMINI_URL, build_payload(prompt, system_prompt, tool_id), tool_id)
+        on_result = (lambda result: response_cache.put(cache_key, result)) if cache_key else None
+        return streaming.sse_response(chunks, generate_result, on_result)
+
+    except Exception as e:
+        logging.exception("Streaming generation failed")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    try:
+        data = request.get_json(force=True)
+        conversation, system_prompt, session, pending, error = build_chat_prompt(data)
+        if error:
             return jsonify({
                 "success": False,
-                "error": "Empty message"
+                "error": error
             }), 400
 
-        system_prompt = PROMPT_TEMPLATES[tool_id]["system"]
+        tool_id = data.get("tool", "chat_general")
+        chunks = streaming.stream_gemini(GEMINI_URL, build_payload(conversation, system_prompt, tool_id), tool_id)
+        return streaming.sse_response(
+            chunks,
+            lambda result: chat_result(result, session),
+            (lambda result: session.record(pending, result)) if session else None
+        )
+
+    except Exception as e:
+        logging.exception("Streaming chat failed")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+def run_generate_item(item: dict) -> dict:
+    prompt, system_prompt, error = build_generate_prompt(item)
+    if error:
+        return {
+            "success": False,
+            "tool": item.get("tool"),
+            "error": error
+        }
+
+    result = call_gemini(prompt, system_prompt, generate_cache_key(item), item.get("tool"))
+    return {"tool": item.get("tool"), **generate_result(result)}
 
-        conversation = ""
-        for turn in history[-10:]:
-            conversation += (
-                f"User: {turn.get('user', '')}\n"
-                f"Assistant: {turn.get('assistant', '')}\n"
-            )
 
-        conversation += f"User: {message}"
+@app.route("/api/generate/batch", methods=["POST"])
+def generate_batch():
+    try:
+        data = request.get_json(force=True, silent=True)
+        items, error = batch.parse_items(data)
+        if error:
+            return jsonify({
+                "success": False,
+                "error": error
+            }), 400
 
-        result = call_gemini(conversation, system_prompt)
+        if data.get("stream"):
+            return batch.sse_response(items, run_generate_item)
 
         return jsonify({
             "success": True,
-            "response": result,
-            "metadata": {
-                "answer": result
-            }
+            "results": batch.run_ordered(items, run_generate_item)
         })
 
     except Exception as e:
-        logging.exception("Chat failed")
+        logging.exception("Batch generation failed")
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({
+            "success": False,
+            "error": "Invalid request body"
+        }), 400
+
+    _, _, error = build_generate_prompt(data)
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+
+    dedupe = jobs.dedupe_key(request.headers.get("Idempotency-Key"), generate_cache_key(data))
+    try:
+        job, created = jobs.submit(data, run_generate_item, dedupe)
+    except jobs.QueueFull:
+        response = jsonify({
+            "success": False,
+            "error": "Too many jobs in progress. Please try again shortly."
+        })
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+
+    response = jsonify({
+        "success": True,
+        "job": jobs.describe(job)
+    })
+    response.status_code = 202 if created else 200
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return response
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job not found or expired"
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "job": jobs.describe(job)
+    })
+
+
 @app.route("/api/health", methods=["GET"])
-def health():
+def health_status():
     return jsonify({
         "status": "healthy",
-        "service": "AI Tool Hub"
+        "service": "AI Tool Hub",
+        "templates_version": PROMPT_TEMPLATES.version,
+        "gemini_pool": gemini_client.pool_stats(),
+        "response_cache": response_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "admission": admission.stats(),
+        "chat_prompts": chat_context.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "resilience": resilience.stats(),
+        "jobs": jobs.stats()
     })
 
 
+@app.route("/api/health/live", methods=["GET"])
+def health_live():
+    return jsonify(health.liveness())
+
+
+@app.route("/api/health/ready", methods=["GET"])
+def health_ready():
+    body, ready = health.readiness()
+    return jsonify(body), (200 if ready else 503)
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "5000"))
     app.run(
@@ -1,12 +1,27 @@
 import logging
 import os
-import requests
-from flask import Flask, request, jsonify, send_from_directory, redirect
+from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
 
-logging.basicConfig(level=logging.INFO)
+import admission
+import batch
+import chat_context
+import chat_sessions
+import gemini_client
+import health
+import jobs
+import log_config
+import metrics
+import prompts
+import resilience
+import response_cache
+import singleflight
+import static_assets
+import streaming
 
-app = Flask(__name__, static_folder=".")
+log_config.configure()
+
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.getenv("SESSION_SECRET", "dev-secret-key")
 CORS(app)
 
@@ -14,137 +29,78 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in environment variables")
 
-GEMINI_URL = (
+# GEMINI_URL may point at a stand-in such as fake_gemini.py (see benchmark.py).
+GEMINI_URL = os.getenv("GEMINI_URL") or (
     "https://generativelanguage.googleapis.com/v1beta/models/"
     f"gemini-2.5-flash:generateContent?key={GOOGLE_API_KEY}"
 )
+health.start(GEMINI_URL)
 
-PROMPT_TEMPLATES = {
-    # Student Hub
-    "notes": {
-        "system": "You are an expert academic note-taker and summarizer.",
-        "template": "Create detailed, well-structured study notes on: {input}\n\nInclude:\n- Key concepts with definitions\n- Important points in bullet form\n- Examples where helpful\n- Summary at the end\n\nUse markdown formatting with headers and bullet points.",
-    },
-    "quiz": {
-        "system": "You are an expert educator who creates effective quiz questions.",
-        "template": "Create a comprehensive quiz with 10 questions on: {input}\n\nFor each question provide:\n- The question\n- 4 multiple choice options (A, B, C, D)\n- The correct answer\n- Brief explanation\n\nFormat clearly with markdown.",
-    },
-    "flashcard": {
-        "system": "You are an expert educator who creates effective flashcards for learning.",
-        "template": "Create 15 flashcards for studying: {input}\n\nFormat each as:\n**Card N:**\n**Front:** [Question/Term]\n**Back:** [Answer/Definition]\n\nMake them concise and memorable.",
-    },
-    "planner": {
-        "system": "You are an expert academic advisor and study planner.",
-        "template": "Create a detailed study plan for: {input}\n\nInclude:\n- Weekly schedule breakdown\n- Daily goals and milestones\n- Study techniques for each topic\n- Resources needed\n- Review checkpoints\n\nFormat as a structured plan with markdown.",
-    },
-    "assignment": {
-        "system": "You are an expert academic assistant who helps students with assignments.",
-        "template": "Help with the following assignment: {input}\n\nProvide:\n- Detailed approach and methodology\n- Key points to cover\n- Well-structured response\n- References to consider\n\nUse clear markdown formatting.",
-    },
-    "research": {
-        "system": "You are an expert research analyst and academic summarizer.",
-        "template": "Summarize and analyze the following research topic: {input}\n\nProvide:\n- Executive summary\n- Key findings and insights\n- Main arguments or theories\n- Critical analysis\n- Conclusions\n\nUse academic markdown formatting.",
-    },
-    # Developer Hub
-    "debug": {
-        "system": "You are a senior software engineer and expert code debugger.",
-        "template": "Analyze the following code, identify any bugs or issues, explain them clearly, and provide a corrected version:\n\n{input}",
-    },
-    "code_gen": {
-        "system": "You are an expert software engineer who writes clean, production-ready code.",
-        "template": "Write code for the following requirement:\n\n{input}\n\nReturn the complete, runnable code with brief inline comments where helpful. Use markdown code blocks.",
-    },
-    "explain": {
-        "system": "You are a programming teacher who explains code in clear, simple terms.",
-        "template": "Explain the following code step by step. Cover what it does, how it works, and any important concepts:\n\n{input}",
-    },
-    "sql": {
-        "system": "You are a database expert who writes efficient, well-structured SQL queries.",
-        "template": "Write an SQL query for the following request:\n\n{input}\n\nReturn the query in a code block, then briefly explain what it does.",
-    },
-    "api_builder": {
-        "system": "You are an expert API architect and backend developer.",
-        "template": "Design and write a complete REST API for: {input}\n\nInclude:\n- Endpoint definitions with methods\n- Request/response schemas\n- Authentication approach\n- Example code\n- Error handling\n\nUse markdown with code blocks.",
-    },
-    "docs": {
-        "system": "You are a technical writer who creates clear, comprehensive documentation.",
-        "template": "Write complete technical documentation for: {input}\n\nInclude:\n- Overview and purpose\n- Installation/setup\n- Usage examples\n- API reference\n- Troubleshooting\n\nFormat in clean markdown.",
-    },
-    # Creator Hub
-    "hook": {
-        "system": "You are a viral content strategist who writes scroll-stopping hooks.",
-        "template": "Write 8 attention-grabbing hooks for content about: {input}\n\nReturn them as a numbered list. Each hook should be punchy, curiosity-driven, and under 20 words.",
-    },
-    "script": {
-        "system": "You are a professional scriptwriter for short-form video content.",
-        "template": "Write a complete short-form video script (60-90 seconds) on the topic: {input}\n\nStructure it with:\n- HOOK (first 3 seconds)\n- BODY (main points with visual cues)\n- CTA (call to action)\n\nKeep it engaging, conversational, and tight.",
-    },
-    "yt_idea": {
-        "system": "You are a YouTube growth strategist with deep knowledge of viral content.",
-        "template": "Generate 10 unique YouTube video ideas for: {input}\n\nFor each idea provide:\n- Title (under 70 chars, high CTR)\n- Hook concept\n- Main angle/value\n- Target audience\n\nFormat as a numbered list.",
-    },
-    "thumbnail": {
-        "system": "You are an expert YouTube thumbnail designer and visual strategist.",
-        "template": "Generate 8 thumbnail concept ideas for a video about: {input}\n\nFor each concept describe:\n- Visual composition\n- Text overlay\n- Color scheme\n- Emotional trigger\n- Why it works\n\nFormat as a numbered list.",
-    },
-    "seo": {
-        "system": "You are an SEO expert specializing in content optimization.",
-        "template": "Generate a complete SEO strategy for: {input}\n\nInclude:\n- 10 primary keywords\n- 10 long-tail keywords\n- 5 question-based keywords\n- Meta title and description\n- Content structure recommendations\n\nFormat cleanly with markdown.",
-    },
-    "caption": {
-        "system": "You are a social media expert who writes high-engagement captions.",
-        "template": "Write 8 engaging social media captions for: {input}\n\nInclude variations for:\n- Instagram\n- Twitter/X\n- LinkedIn\n- TikTok\n\nEach with relevant hashtags. Format as a numbered list.",
-    },
-    # Chat modes
-    "chat_general": {
-        "system": "You are GYRA, a helpful, friendly, and knowledgeable AI assistant. Give clear, accurate, and concise responses. Format with markdown when helpful.",
-        "template": "{input}",
-    },
-    "chat_student": {
-        "system": "You are GYRA, an expert academic tutor and study companion. Explain concepts clearly, use examples, and help students understand and learn effectively.",
-        "template": "{input}",
-    },
-    "chat_dev": {
-        "system": "You are GYRA, an expert software engineer and coding assistant. Provide clean, production-ready code with explanations. Use markdown code blocks.",
-        "template": "{input}",
-    },
-    "chat_creator": {
-        "system": "You are GYRA, a creative strategist and content expert. Help creators with ideas, scripts, content strategy, and growth.",
-        "template": "{input}",
-    },
-}
-
-
-def call_gemini(prompt: str, system_message: str = "You are a helpful AI assistant.") -> str:
-    try:
-        payload = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [{"text": f"{system_message}\n\nUser: {prompt}"}],
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "maxOutputTokens": 8192,
+PROMPT_TEMPLATES = prompts.load("gyra")
+
+log_config.init_app(app)
+metrics.init_app(app, PROMPT_TEMPLATES)
+admission.init_app(app)
+static_assets.init_app(app)
+
+
+def build_payload(prompt: str, system_message: str = "You are a helpful AI assistant.", tool_id: str = None) -> dict:
+    # generationConfig (and search grounding, if enabled) come from prompt_templates.json.
+    return {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [{"text": PROMPT_TEMPLATES.user_text(system_message, prompt)}],
             }
-        }
-        response = requests.post(GEMINI_URL, json=payload, timeout=60)
-        data = response.json()
+        ],
+        **PROMPT_TEMPLATES.options(tool_id),
+    }
+
 
-        logging.info("Gemini status: %s", response.status_code)
+def call_gemini(
+    prompt: str,
+    system_message: str = "You are a helpful AI assistant.",
+    cache_key: str = None,
+    tool_id: str = None,
+) -> str:
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    return singleflight.do(
+        singleflight.prompt_key(prompt, system_message),
+        lambda: _call_gemini(prompt, system_message, cache_key, tool_id),
+    )
+
+
+def _call_gemini(prompt: str, system_message: str, cache_key: str = None, tool_id: str = None) -> str:
+    try:
+        payload = build_payload(prompt, system_message, tool_id)
+        with metrics.upstream(tool_id, payload) as call:
+            response = resilience.post(GEMINI_URL, payload, tool_id)
+            data = response.json()
+            call.finish(response.status_code, data.get("usageMetadata"), len(response.content))
+
+        log_config.log_upstream(tool_id, response.status_code, call.duration, data)
+        if response.status_code == 429:
+            logging.warning("Gemini quota exhausted (HTTP 429)")
 
         if "candidates" in data:
-            return data["candidates"][0]["content"]["parts"][0]["text"]
+            text = data["candidates"][0]["content"]["parts"][0]["text"]
+            if cache_key:
+                response_cache.put(cache_key, text)
+            return text
 
         if "error" in data:
             return f"API Error: {data['error'].get('message', 'Unknown error')}"
 
         logging.error("Unexpected Gemini response: %s", data)
         return "Sorry, I couldn't generate a response. Please try again."
+    except resilience.CircuitOpenError:
+        return "AI service is busy right now. Please try again in a few seconds."
     except Exception as e:
         logging.exception("Gemini API error")
-        return f"AI service temporarily unavailable: {e}"
+        return f"AI service temporarily unavailable: {log_config.redact(str(e))}"
 
 
 @app.route('/')
@@ -152,22 +108,70 @@ def index():
     return redirect('https://zyra-pro.netlify.app')
 
 
+def build_generate_prompt(data: dict):
+    """Validate a /api/generate body and return (prompt, system, error)."""
+    tool_id = data.get("tool", "")
+    user_input = (data.get("input") or "").strip()
+    target = data.get("target", "Python")
+
+    if tool_id not in PROMPT_TEMPLATES:
+        return None, None, f"Unknown tool: {tool_id}"
+    if not user_input:
+        return None, None, "Please provide some input."
+
+    tpl = PROMPT_TEMPLATES[tool_id]
+    return tpl.render(user_input, target), tpl.system, None
+
+
+def build_chat_prompt(data: dict):
+    """Validate a /api/chat body and return (conversation, system, session, pending, error).
+
+    ``session`` is None unless the client uses server-side sessions; then
+    ``pending`` goes back to ``session.record`` with the reply.
+    """
+    tool_id = data.get("tool", "chat_general")
+    message = (data.get("message") or "").strip()
+    history = data.get("history", [])
+
+    if tool_id not in PROMPT_TEMPLATES:
+        return None, None, None, None, "Unknown chatbot"
+    if not message:
+        return None, None, None, None, "Empty message"
+
+    system_prompt = PROMPT_TEMPLATES[tool_id].system
+
+    session = chat_sessions.open_session(data)
+    pending = None
+    if session:
+        conversation, pending = session.render(tool_id, message, bool(data.get("regenerate")))
+    else:
+        conversation = chat_context.build_conversation(tool_id, history, message)
+    return conversation, system_prompt, session, pending, None
+
+
+def chat_result(result: str, session=None) -> dict:
+    body = {"success": True, "response": result}
+    if session:
+        body["session_id"] = session.id
+    return body
+
+
+def generate_cache_key(data: dict):
+    tool_id = data.get("tool", "")
+    return response_cache.template_key(
+        tool_id, PROMPT_TEMPLATES[tool_id], data.get("input") or "", data.get("target", "Python")
+    )
+
+
 @app.route("/api/generate", methods=["POST"])
 def generate():
     try:
         data = request.get_json(force=True)
-        tool_id = data.get("tool", "")
-        user_input = (data.get("input") or "").strip()
-        target = data.get("target", "Python")
-
-        if tool_id not in PROMPT_TEMPLATES:
-            return jsonify({"success": False, "error": f"Unknown tool: {tool_id}"}), 400
-        if not user_input:
-            return jsonify({"success": False, "error": "Please provide some input."}), 400
-
-        tpl = PROMPT_TEMPLATES[tool_id]
-        prompt = tpl["template"].format(input=user_input, target=target)
-        result = call_gemini(prompt, tpl["system"])
+        prompt, system_prompt, error = build_generate_prompt(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
+        result = call_gemini(prompt, system_prompt, generate_cache_key(data), data.get("tool"))
         return jsonify({"success": True, "content": result})
     except Exception as e:
         logging.exception("Generation failed")
@@ -178,32 +182,146 @@ def generate():
 def chat():
     try:
         data = request.get_json(force=True)
+        conversation, system_prompt, session, pending, error = build_chat_prompt(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
+        result = call_gemini(conversation, system_prompt, tool_id=data.get("tool", "chat_general"))
+        if session:
+            session.record(pending, result)
+        return jsonify(chat_result(result, session))
+    except Exception as e:
+        logging.exception("Chat failed")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/generate/stream", methods=["POST"])
+def generate_stream():
+    try:
+        data = request.get_json(force=True)
+        prompt, system_prompt, error = build_generate_prompt(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
+        build_result = lambda result: {"success": True, "content": result}
+        cache_key = generate_cache_key(data)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return streaming.sse_response(iter([cached]), build_result)
+
+        tool_id = data.get("tool")
+        chunks = streaming.stream_gemini(GEMINI_URL, build_payload(prompt, system_prompt, tool_id), tool_id)
+        on_result = (lambda result: response_cache.put(cache_key, result)) if cache_key else None
+        return streaming.sse_response(chunks, build_result, on_result)
+    except Exception as e:
+        logging.exception("Streaming generation failed")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    try:
+        data = request.get_json(force=True)
+        conversation, system_prompt, session, pending, error = build_chat_prompt(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
         tool_id = data.get("tool", "chat_general")
-        message = (data.get("message") or "").strip()
-        history = data.get("history", [])
+        chunks = streaming.stream_gemini(GEMINI_URL, build_payload(conversation, system_prompt, tool_id), tool_id)
+        return streaming.sse_response(
+            chunks,
+            lambda result: chat_result(result, session),
+            (lambda result: session.record(pending, result)) if session else None,
+        )
+    except Exception as e:
+        logging.exception("Streaming chat failed")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 
-        if tool_id not in PROMPT_TEMPLATES:
-            return jsonify({"success": False, "error": "Unknown chatbot"}), 400
-        if not message:
-            return jsonify({"success": False, "error": "Empty message"}), 400
+def run_generate_item(item: dict) -> dict:
+    prompt, system_prompt, error = build_generate_prompt(item)
+    if error:
+        return {"success": False, "tool": item.get("tool"), "error": error}
 
-        system_prompt = PROMPT_TEMPLATES[tool_id]["system"]
+    result = call_gemini(prompt, system_prompt, generate_cache_key(item), item.get("tool"))
+    return {"success": True, "tool": item.get("tool"), "content": result}
 
-        conversation = ""
-        for turn in history[-10:]:
-            conversation += f"User: {turn.get('user', '')}\nAssistant: {turn.get('assistant', '')}\n"
-        conversation += f"User: {message}"
 
-        result = call_gemini(conversation, system_prompt)
-        return jsonify({"success": True, "response": result})
+@app.route("/api/generate/batch", methods=["POST"])
+def generate_batch():
+    try:
+        data = request.get_json(force=True, silent=True)
+        items, error = batch.parse_items(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
+        if data.get("stream"):
+            return batch.sse_response(items, run_generate_item)
+        return jsonify({"success": True, "results": batch.run_ordered(items, run_generate_item)})
     except Exception as e:
-        logging.exception("Chat failed")
+        logging.exception("Batch generation failed")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Invalid request body"}), 400
+
+    _, _, error = build_generate_prompt(data)
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+
+    dedupe = jobs.dedupe_key(request.headers.get("Idempotency-Key"), generate_cache_key(data))
+    try:
+        job, created = jobs.submit(data, run_generate_item, dedupe)
+    except jobs.QueueFull:
+        response = jsonify({"success": False, "error": "Too many jobs in progress. Please try again shortly."})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+
+    response = jsonify({"success": True, "job": jobs.describe(job)})
+    response.status_code = 202 if created else 200
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return response
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found or expired"}), 404
+    return jsonify({"success": True, "job": jobs.describe(job)})
+
+
 @app.route("/api/health", methods=["GET"])
-def health():
-    return jsonify({"status": "healthy", "service": "GYRA AI Workspace"})
+def health_status():
+    return jsonify({
+        "status": "healthy",
+        "service": "GYRA AI Workspace",
+        "templates_version": PROMPT_TEMPLATES.version,
+        "gemini_pool": gemini_client.pool_stats(),
+        "response_cache": response_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "admission": admission.stats(),
+        "chat_prompts": chat_context.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "resilience": resilience.stats(),
+        "jobs": jobs.stats(),
+    })
+
+
+@app.route("/api/health/live", methods=["GET"])
+def health_live():
+    return jsonify(health.liveness())
+
+
+@app.route("/api/health/ready", methods=["GET"])
+def health_ready():
+    body, ready = health.readiness()
+    return jsonify(body), (200 if ready else 503)
 
 
 if __name__ == "__main__":
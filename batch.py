@@ -0,0 +1,71 @@
+"""Fan-out of several /api/generate items in one request.
+
+``/api/generate/batch`` accepts ``{"items": [{tool, input, target}, ...]}`` and
+runs the items concurrently, at most BATCH_MAX_PARALLEL at a time. Results
+come back as one JSON list in request order or, with ``"stream": true``, as
+Server-Sent Events in completion order:
+
+    event: item
+    data: {"index": 0, "success": true, "content": "...", ...}
+    event: done
+    data: {"success": true, "count": 4}
+
+A failing item is reported in its own result and never fails the batch.
+"""
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streaming
+
+MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10"))
+MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+
+def parse_items(data: dict):
+    """Validate a batch body and return (items, error)."""
+    if not isinstance(data, dict):
+        return None, "Invalid request body"
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return None, "Please provide a non-empty list of items."
+    if len(items) > MAX_ITEMS:
+        return None, f"A batch can contain at most {MAX_ITEMS} items."
+    return items, None
+
+
+def _run_one(run_item, item) -> dict:
+    if not isinstance(item, dict):
+        return {"success": False, "error": "Each item must be an object."}
+    try:
+        return run_item(item)
+    except Exception as e:
+        logging.exception("Batch item failed")
+        return {"success": False, "error": str(e)}
+
+
+def run(items: list, run_item):
+    """Yield each item's result dict, tagged with its index, as it finishes."""
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(items))) as pool:
+        # Each item runs in a copy of the request's context so its log lines
+        # keep the request id.
+        futures = {
+            pool.submit(contextvars.copy_context().run, _run_one, run_item, item): i
+            for i, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            yield {"index": futures[future], **future.result()}
+
+
+def run_ordered(items: list, run_item) -> list:
+    return sorted(run(items, run_item), key=lambda result: result["index"])
+
+
+def sse_response(items: list, run_item):
+    def events():
+        for result in run(items, run_item):
+            yield streaming.sse_event(result, "item")
+        yield streaming.sse_event({"success": True, "count": len(items)}, "done")
+
+    return streaming.event_stream(events())
@@ -0,0 +1,399 @@
+"""Load test for app.py / app1.py against a local fake Gemini.
+
+Starts fake_gemini.py, then for each serving mode in gunicorn.conf.py
+(sync, threaded, async) boots the app under gunicorn with GEMINI_URL
+pointed at the fake, drives it with a realistic mix of tool calls, chat
+turns, chat streams and static pages from concurrent keep-alive clients,
+and reports throughput, latency percentiles and error rates per scenario:
+
+    python benchmark.py                                  # all modes, 30s each
+    python benchmark.py --modes async --concurrency 200 --workers 2
+    python benchmark.py --app app1 --mix api --latency 2.5 --error-rate 0.02
+    python benchmark.py --target http://127.0.0.1:5000   # an already running server
+    python benchmark.py --admission                      # with admission control on
+
+Use ``--save`` to keep a run as a baseline and ``--compare`` to check a later
+run against it: the exit status is 1 when p95 latency, throughput or error
+rate regress beyond ``--tolerance``, so it can gate a deploy.
+
+Rate limiting is switched off for the app under test unless ``--admission``
+is given. With it, admission control runs on a fresh shared SQLite file with
+budgets and an in-flight cap too large to reject the load, so the run
+measures what the checks themselves cost. A fraction of generate inputs
+(``--cache-hit-ratio``) repeat, so the response cache sees a realistic hit
+rate instead of none or all.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import fake_gemini
+from gemini_client import UPSTREAM_ERRORS, percentile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MODES = ("sync", "threaded", "async")
+PROFILES = {"app": "tools", "app1": "gyra"}
+
+MIXES = {
+    "default": {"generate": 45, "chat": 20, "chat_stream": 5, "static": 30},
+    "api": {"generate": 65, "chat": 25, "chat_stream": 10},
+    "static": {"static": 100},
+}
+
+TOPICS = (
+    "how to start a food blog in 2026",
+    "python script to rename files by date",
+    "study plan for the GATE exam in three months",
+    "instagram caption for a beach sunset photo",
+    "cold email to a potential SaaS customer",
+    "explain recursion to a beginner",
+    "ideas for a tech youtube channel",
+    "meta description for an AI tools landing page",
+)
+
+
+def _tools(profile: str) -> tuple:
+    with open(os.path.join(ROOT, "prompt_templates.json"), encoding="utf-8") as f:
+        tools = json.load(f)["profiles"][profile]["tools"]
+    generate = [t for t in tools if not t.startswith("chat_")]
+    chat = [t for t in tools if t.startswith("chat_")]
+    return generate, chat
+
+
+def _static_paths() -> list:
+    paths = ["/"]
+    for name in sorted(os.listdir(ROOT)):
+        if name.endswith(".html") and " " not in name:
+            paths.append("/" + name[:-5])
+    images = os.path.join(ROOT, "images")
+    if os.path.isdir(images):
+        paths.extend(
+            "/images/" + name for name in sorted(os.listdir(images))
+            if os.path.splitext(name)[1].lower() in (".png", ".jpg", ".jpeg", ".webp")
+        )
+    return paths
+
+
+class Workload:
+    """Builds requests for each scenario in a mix."""
+
+    def __init__(self, profile: str, mix: dict, cache_hit_ratio: float):
+        self.generate_tools, self.chat_tools = _tools(profile)
+        self.static_paths = _static_paths()
+        self.cache_hit_ratio = cache_hit_ratio
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+
+    def _text(self) -> str:
+        topic = random.choice(TOPICS)
+        if random.random() < self.cache_hit_ratio:
+            return topic
+        return f"{topic} ({uuid.uuid4().hex[:8]})"
+
+    def _chat_body(self) -> dict:
+        history = [
+            {"user": random.choice(TOPICS), "assistant": " ".join(fake_gemini.WORDS) * 3}
+            for _ in range(random.randint(0, 6))
+        ]
+        return {"tool": random.choice(self.chat_tools), "message": self._text(), "history": history}
+
+    def next(self) -> tuple:
+        """Return (scenario, method, path, body) for the next request."""
+        scenario = random.choices(self.scenarios, self.weights)[0]
+        if scenario == "generate":
+            body = {"tool": random.choice(self.generate_tools), "input": self._text(), "target": "Python"}
+            return scenario, "POST", "/api/generate", body
+        if scenario == "chat":
+            return scenario, "POST", "/api/chat", self._chat_body()
+        if scenario == "chat_stream":
+            return scenario, "POST", "/api/chat/stream", self._chat_body()
+        return scenario, "GET", random.choice(self.static_paths), None
+
+
+def _failed(scenario: str, status: int, body: bytes) -> bool:
+    if status >= 400:
+        return True
+    if scenario == "chat_stream":
+        return b"event: error" in body
+    if scenario in ("generate", "chat"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return True
+        if not data.get("success"):
+            return True
+        # The apps answer 200 with an error text when the upstream call failed.
+        content = data.get("content") or data.get("response") or ""
+        return content.startswith(UPSTREAM_ERRORS)
+    return False
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, scenario: str, latency: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(scenario, []).append((latency, ok))
+
+    def report(self, elapsed: float) -> dict:
+        with self._lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        samples["all"] = [s for values in samples.values() for s in values]
+        report = {}
+        for name, values in samples.items():
+            latencies = sorted(latency for latency, _ in values)
+            errors = sum(1 for _, ok in values if not ok)
+            report[name] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 50) * 1000),
+                "p95_ms": round(percentile(latencies, 95) * 1000),
+                "p99_ms": round(percentile(latencies, 99) * 1000),
+                "error_rate": round(errors / len(values), 4) if values else 0.0,
+            }
+        return report
+
+
+def _client(base: str, workload: Workload, recorder: Recorder, warmup_until: float, stop_at: float, timeout: float):
+    """One closed-loop client on its own keep-alive connection."""
+    parts = urlsplit(base)
+    conn = None
+    while time.monotonic() < stop_at:
+        scenario, method, path, body = workload.next()
+        headers = {"Accept-Encoding": "br, gzip", "Accept": "image/avif,image/webp,*/*"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        start = time.monotonic()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+            conn.request(method, path, body=data, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+            ok = not _failed(scenario, response.status, payload)
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            ok = False
+            if conn is not None:
+                conn.close()
+            conn = None
+        if start >= warmup_until:
+            recorder.add(scenario, time.monotonic() - start, ok)
+    if conn is not None:
+        conn.close()
+
+
+def run_load(base: str, workload: Workload, concurrency: int, duration: float, warmup: float, timeout: float) -> dict:
+    recorder = Recorder()
+    started = time.monotonic()
+    warmup_until = started + warmup
+    stop_at = warmup_until + duration
+    clients = [
+        threading.Thread(
+            target=_client,
+            args=(base, workload, recorder, warmup_until, stop_at, timeout),
+            daemon=True,
+        )
+        for _ in range(concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return recorder.report(max(time.monotonic() - warmup_until, 0.001))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_live(base: str, process: subprocess.Popen, timeout: float = 60):
+    parts = urlsplit(base)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            conn.request("GET", "/api/health/live")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("server did not become live in time")
+
+
+def admission_env(state_dir: str, mode: str, concurrency: int) -> dict:
+    """Environment that keeps admission control on without rejecting the load."""
+    unlimited = "1000000/1"
+    return {
+        "RATE_LIMIT_ENABLED": "1",
+        "RATE_LIMIT_DB": os.path.join(state_dir, f"admission-{mode}.db"),
+        "RATE_LIMIT_CHAT": unlimited,
+        "RATE_LIMIT_SHORT": unlimited,
+        "RATE_LIMIT_LONG": unlimited,
+        "GLOBAL_MAX_IN_FLIGHT": str(concurrency * 2),
+    }
+
+
+def start_server(app: str, mode: str, workers: int, gemini_url: str, extra_env: dict) -> tuple:
+    """Boot ``app`` under gunicorn in ``mode``; return (process, base_url, metrics_dir)."""
+    port = _free_port()
+    metrics_dir = tempfile.mkdtemp(prefix="qwickgen-bench-metrics-")
+    env = dict(os.environ)
+    env.update({
+        "SERVING_MODE": mode,
+        "GEMINI_URL": gemini_url,
+        "GOOGLE_API_KEY": env.get("GOOGLE_API_KEY") or "fake-key",
+        "RATE_LIMIT_ENABLED": "0",
+        "PROMETHEUS_MULTIPROC_DIR": metrics_dir,
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    env.update(extra_env)
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        f"{app}:app",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_live(base, process)
+    except Exception:
+        stop_server(process, metrics_dir)
+        raise
+    return process, base, metrics_dir
+
+
+def stop_server(process: subprocess.Popen, metrics_dir: str):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def print_report(results: dict):
+    header = f"{'mode':<9} {'scenario':<12} {'requests':>9} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for mode, report in results.items():
+        for scenario in sorted(report, key=lambda name: (name == "all", name)):
+            row = report[scenario]
+            print(
+                f"{mode:<9} {scenario:<12} {row['requests']:>9} {row['rps']:>8} {row['p50_ms']:>8} "
+                f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['error_rate'] * 100:>6.2f}%"
+            )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a line per metric that regressed against ``baseline``."""
+    regressions = []
+    for mode, report in results.items():
+        for scenario, row in report.items():
+            old = baseline.get(mode, {}).get(scenario)
+            if not old or not old["requests"]:
+                continue
+            label = f"{mode}/{scenario}"
+            if row["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{label}: p95 {old['p95_ms']} -> {row['p95_ms']} ms")
+            if row["rps"] < old["rps"] * (1 - tolerance):
+                regressions.append(f"{label}: rps {old['rps']} -> {row['rps']}")
+            if row["error_rate"] > old["error_rate"] + 0.01:
+                regressions.append(f"{label}: error rate {old['error_rate']:.2%} -> {row['error_rate']:.2%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--app", choices=sorted(PROFILES), default="app")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated serving modes")
+    parser.add_argument("--target", help="benchmark a running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker in threaded mode")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per mode")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before each run")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.2)
+    parser.add_argument("--admission", action="store_true", help="keep admission control enabled")
+    parser.add_argument("--save", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    workload = Workload(PROFILES[args.app], MIXES[args.mix], args.cache_hit_ratio)
+    results = {}
+    if args.target:
+        results["external"] = run_load(
+            args.target.rstrip("/"), workload, args.concurrency, args.duration, args.warmup, args.timeout
+        )
+    else:
+        fake = fake_gemini.serve(settings=fake_gemini.settings_from_args(args))
+        state_dir = tempfile.mkdtemp(prefix="qwickgen-bench-state-")
+        try:
+            for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+                if mode not in MODES:
+                    parser.error(f"unknown mode: {mode}")
+                print(f"== {mode}: {args.workers} workers, {args.concurrency} clients, {args.duration:g}s", flush=True)
+                extra_env = {"THREADS": str(args.threads)}
+                if args.admission:
+                    extra_env.update(admission_env(state_dir, mode, args.concurrency))
+                process, base, metrics_dir = start_server(
+                    args.app, mode, args.workers, fake_gemini.base_url(fake), extra_env
+                )
+                try:
+                    results[mode] = run_load(
+                        base, workload, args.concurrency, args.duration, args.warmup, args.timeout
+                    )
+                finally:
+                    stop_server(process, metrics_dir)
+        finally:
+            fake.shutdown()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    print()
+    print_report(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against " + args.compare + ":")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("\nNo regressions against " + args.compare)
+
+
+if __name__ == "__main__":
+    main()
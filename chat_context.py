@@ -0,0 +1,225 @@
+"""Token-budgeted prompt building for /api/chat.
+
+Instead of pasting the last ten history turns verbatim, the conversation
+sent to Gemini is kept under CHAT_PROMPT_TOKEN_BUDGET:
+
+* each turn is clipped to CHAT_MAX_TURN_TOKENS
+* the newest turns are kept first; older turns that no longer fit are
+  replaced by a one-line summary of what the user asked about
+* the prompt is assembled in a single join
+
+Tokens are estimated at roughly four characters each, which is close enough
+for Gemini's tokenizer on English text and costs nothing to compute.
+Prompt-size stats per chat mode are reported through ``stats()``.
+
+``Conversation`` applies the same rules to a server-side session (see
+chat_sessions.py) incrementally: turns are clipped once, when they are
+added, and the rendered prefix is kept between messages, so a new message
+costs an append and a concatenation instead of a rebuild. Each turn also
+keeps a hash of the user's unclipped message, so a regenerate request can
+be matched to its turn however long the message was.
+"""
+import hashlib
+import os
+import threading
+
+TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "4000"))
+MAX_TURN_TOKENS = int(os.getenv("CHAT_MAX_TURN_TOKENS", "800"))
+MAX_TURNS = int(os.getenv("CHAT_MAX_TURNS", "10"))
+SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "120"))
+CHARS_PER_TOKEN = 4
+TURN_OVERHEAD = 4
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def clip(text: str, max_tokens: int):
+    """Return (text, clipped) with ``text`` cut to about ``max_tokens``."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text, False
+    return text[:limit].rstrip() + " …", True
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _topic(user: str) -> str:
+    return " ".join(user.split())[:60]
+
+
+def _summary(topics: list, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN - 60
+    kept = []
+    size = 0
+    for topic in topics:
+        if not topic:
+            continue
+        if size + len(topic) > limit:
+            break
+        kept.append(topic)
+        size += len(topic) + 2
+    if not kept:
+        return ""
+    return "(Earlier in this conversation the user asked about: " + "; ".join(kept) + ")\n"
+
+
+def build_conversation(tool_id: str, history: list, message: str) -> str:
+    turns = []
+    for turn in history[-MAX_TURNS:] if isinstance(history, list) else []:
+        if isinstance(turn, dict):
+            # ai-tools.html stores the reply as "ai", zyra.html as "assistant".
+            assistant = turn.get("assistant") or turn.get("ai") or ""
+            turns.append((str(turn.get("user") or ""), str(assistant)))
+
+    clipped = []
+    for user, assistant in turns:
+        user, user_clipped = clip(user, MAX_TURN_TOKENS)
+        assistant, assistant_clipped = clip(assistant, MAX_TURN_TOKENS)
+        cost = estimate_tokens(user) + estimate_tokens(assistant) + TURN_OVERHEAD
+        clipped.append((user, assistant, cost, user_clipped + assistant_clipped))
+
+    budget = TOKEN_BUDGET - estimate_tokens(message) - TURN_OVERHEAD
+    if sum(cost for _, _, cost, _ in clipped) > budget:
+        # Not every turn fits: keep room for the summary of those dropped.
+        budget -= SUMMARY_TOKENS
+    kept = []
+    truncated = 0
+    for user, assistant, cost, was_clipped in reversed(clipped):
+        if cost > budget:
+            break
+        budget -= cost
+        truncated += was_clipped
+        kept.append((user, assistant))
+
+    dropped = turns[:len(turns) - len(kept)]
+    parts = []
+    if dropped:
+        parts.append(_summary([_topic(user) for user, _ in dropped], SUMMARY_TOKENS))
+    for user, assistant in reversed(kept):
+        parts.extend(("User: ", user, "\nAssistant: ", assistant, "\n"))
+    parts.extend(("User: ", message))
+    conversation = "".join(parts)
+
+    _record(tool_id, estimate_tokens(conversation), len(dropped), truncated)
+    return conversation
+
+
+class Conversation:
+    """Token-budgeted history of one chat session, rendered incrementally."""
+
+    MAX_TOPICS = 20
+
+    def __init__(self):
+        self.turns = []
+        self.topics = []
+        self.tokens = 0
+        self._prefix = None
+
+    @classmethod
+    def from_history(cls, history: list) -> "Conversation":
+        """Seed a session from a client-side ``history`` list."""
+        conversation = cls()
+        for turn in history[-MAX_TURNS:] if isinstance(history, list) else []:
+            if isinstance(turn, dict):
+                assistant = turn.get("assistant") or turn.get("ai") or ""
+                conversation.add(str(turn.get("user") or ""), str(assistant))
+        return conversation
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Conversation":
+        conversation = cls()
+        for turn in data.get("turns", []):
+            conversation._append(*turn)
+        conversation.topics = list(data.get("topics", []))
+        return conversation
+
+    def to_dict(self) -> dict:
+        return {
+            "turns": [[user, assistant, sent] for user, assistant, _, sent in self.turns],
+            "topics": self.topics,
+        }
+
+    def _append(self, user: str, assistant: str, sent: str = None):
+        cost = estimate_tokens(user) + estimate_tokens(assistant) + TURN_OVERHEAD
+        self.turns.append((user, assistant, cost, sent or digest(user)))
+        self.tokens += cost
+        self._prefix = None
+
+    def add(self, user: str, assistant: str) -> int:
+        """Append a finished turn; returns how many of its sides were clipped."""
+        sent = digest(user)
+        user, user_clipped = clip(user, MAX_TURN_TOKENS)
+        assistant, assistant_clipped = clip(assistant, MAX_TURN_TOKENS)
+        self._append(user, assistant, sent)
+        while len(self.turns) > MAX_TURNS:
+            self._drop_oldest()
+        return user_clipped + assistant_clipped
+
+    def ends_with(self, user: str) -> bool:
+        """Whether the newest turn was sent as ``user``, compared unclipped."""
+        return bool(self.turns) and self.turns[-1][3] == digest(user)
+
+    def pop(self):
+        """Remove the newest turn (to regenerate it) and return its user text."""
+        if not self.turns:
+            return None
+        user, _, cost, _ = self.turns.pop()
+        self.tokens -= cost
+        self._prefix = None
+        return user
+
+    def _drop_oldest(self):
+        user, _, cost, _ = self.turns.pop(0)
+        self.tokens -= cost
+        self.topics = (self.topics + [_topic(user)])[-self.MAX_TOPICS:]
+        self._prefix = None
+
+    def render(self, tool_id: str, message: str) -> str:
+        """The prompt for ``message``: summary, kept turns, then the message."""
+        reserve = estimate_tokens(message) + TURN_OVERHEAD
+        dropped = 0
+        while self.turns and self.tokens + reserve + (SUMMARY_TOKENS if self.topics else 0) > TOKEN_BUDGET:
+            self._drop_oldest()
+            dropped += 1
+        if self._prefix is None:
+            parts = [_summary(self.topics, SUMMARY_TOKENS)] if self.topics else []
+            for user, assistant, _, _ in self.turns:
+                parts.extend(("User: ", user, "\nAssistant: ", assistant, "\n"))
+            self._prefix = "".join(parts)
+        conversation = self._prefix + "User: " + message
+        _record(tool_id, estimate_tokens(conversation), dropped, 0)
+        return conversation
+
+
+def _record(tool_id: str, tokens: int, dropped: int, truncated: int):
+    with _lock:
+        entry = _stats.setdefault(tool_id, {
+            "requests": 0,
+            "prompt_tokens_total": 0,
+            "prompt_tokens_max": 0,
+            "turns_dropped": 0,
+            "turns_truncated": 0,
+        })
+        entry["requests"] += 1
+        entry["prompt_tokens_total"] += tokens
+        entry["prompt_tokens_max"] = max(entry["prompt_tokens_max"], tokens)
+        entry["turns_dropped"] += dropped
+        entry["turns_truncated"] += truncated
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            tool_id: {
+                **entry,
+                "prompt_tokens_avg": round(entry["prompt_tokens_total"] / entry["requests"]),
+            }
+            for tool_id, entry in _stats.items()
+        }
@@ -0,0 +1,215 @@
+"""Server-side chat sessions for /api/chat.
+
+A client that sends ``"session_id"`` in its chat body (``null`` to start a
+session) gets one back and from then on sends only the new message instead
+of its whole history. The server keeps each session's turns as a
+chat_context.Conversation, so the prompt prefix is rendered once and
+extended per turn, and request size stays constant however long the chat
+gets.
+
+* Sessions live in an in-process LRU (CHAT_SESSION_MAX_ENTRIES) and expire
+  after CHAT_SESSION_TTL seconds without a message.
+* Sessions are also written to a SQLite file (CHAT_SESSION_DB) that every
+  gunicorn worker shares, so a session continues on any worker. Each write
+  is a compare-and-swap on the stored version: when another worker wrote
+  first, the session is reloaded and the change (a new turn, or a
+  regenerate) is applied again on top, so no turn is lost. A worker only
+  reuses its in-memory copy (and rendered prefix) while its version is
+  current. Set CHAT_SESSION_DB to an empty string to keep sessions per
+  process instead.
+* An unknown or expired id starts a fresh session, seeded from ``history``
+  if the client still sends one.
+* ``"regenerate": true`` replaces the last turn instead of adding one.
+
+Clients that send no ``session_id`` keep the stateless ``history`` contract.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+import chat_context
+from gemini_client import UPSTREAM_ERRORS
+from response_cache import LRUCache
+from sqlite_db import Database
+
+MAX_ENTRIES = int(os.getenv("CHAT_SESSION_MAX_ENTRIES", "5000"))
+MAX_BYTES = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+TTL = float(os.getenv("CHAT_SESSION_TTL", str(6 * 3600)))
+DB_PATH = os.getenv("CHAT_SESSION_DB", os.path.join(tempfile.gettempdir(), "qwickgen-chat-sessions.db"))
+
+SAVE_ATTEMPTS = 5
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Session:
+    def __init__(self, session_id: str, conversation: chat_context.Conversation):
+        self.id = session_id
+        self.conversation = conversation
+        self.version = 0
+
+    def render(self, tool_id: str, message: str, regenerate: bool = False) -> tuple:
+        """Return (prompt, pending) for ``message``.
+
+        ``pending`` is handed back to ``record`` with the reply, so concurrent
+        requests on one session each store their own message.
+        """
+        if regenerate:
+            def drop_last(conversation):
+                if not conversation.ends_with(message):
+                    return False
+                conversation.pop()
+                return True
+
+            _commit(self, drop_last)
+        with _lock:
+            return self.conversation.render(tool_id, message), message
+
+    def record(self, pending: str, reply: str):
+        """Add the finished turn. Error replies are not kept as history."""
+        if not pending or not reply or reply.startswith(UPSTREAM_ERRORS):
+            return
+
+        def add(conversation):
+            conversation.add(pending, reply)
+            return True
+
+        _commit(self, add)
+
+
+class SQLiteSessions:
+    """Session bodies in a SQLite file, each row carrying its version."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        self.db = Database(
+            path,
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, version INTEGER NOT NULL, body TEXT NOT NULL, expires REAL NOT NULL)",
+        )
+        self._writes = 0
+
+    def get(self, session_id: str):
+        """Return (version, body), or None if unknown or expired."""
+        rows = self.db.execute(
+            "SELECT version, body FROM sessions WHERE id = ? AND expires > ?", (session_id, time.time())
+        )
+        return rows[0] if rows else None
+
+    def put(self, session: Session):
+        self.db.execute(
+            "INSERT OR REPLACE INTO sessions (id, version, body, expires) VALUES (?, ?, ?, ?)",
+            (session.id, session.version, _body(session), time.time() + TTL),
+        )
+
+    def swap(self, session: Session) -> bool:
+        """Store ``session`` as the next version if ``session.version`` is still current."""
+        changed = self.db.update(
+            "UPDATE sessions SET version = version + 1, body = ?, expires = ? "
+            "WHERE id = ? AND version = ? AND expires > ?",
+            (_body(session), time.time() + TTL, session.id, session.version, time.time()),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.db.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+        return changed == 1
+
+
+_lock = threading.Lock()
+_memory = LRUCache(MAX_ENTRIES, MAX_BYTES, TTL)
+_disk = SQLiteSessions(DB_PATH) if DB_PATH else None
+_stats = {"created": 0, "resumed": 0, "expired": 0, "conflicts": 0}
+
+
+def _body(session: Session) -> str:
+    return json.dumps(session.conversation.to_dict())
+
+
+def _conversation(body: str) -> chat_context.Conversation:
+    return chat_context.Conversation.from_dict(json.loads(body))
+
+
+def _remember(session: Session):
+    _memory.set(session.id, session, session.conversation.tokens * chat_context.CHARS_PER_TOKEN)
+
+
+def _commit(session: Session, change) -> bool:
+    """Apply ``change(conversation)`` to ``session`` and store the result.
+
+    ``change`` returns False when it has nothing to do. If another worker
+    stored a newer version first, the session is reloaded and ``change`` is
+    applied again on top of it.
+    """
+    with _lock:
+        for _ in range(SAVE_ATTEMPTS):
+            if not change(session.conversation):
+                return False
+            if _disk is None:
+                session.version += 1
+            elif not _disk.swap(session):
+                _stats["conflicts"] += 1
+                stored = _disk.get(session.id)
+                if stored is not None:
+                    session.version, session.conversation = stored[0], _conversation(stored[1])
+                    continue
+                # Expired meanwhile; this copy becomes the session again.
+                session.version += 1
+                _disk.put(session)
+            else:
+                session.version += 1
+            _remember(session)
+            return True
+    logging.warning("Chat session %s kept changing under this worker; dropped a change", session.id)
+    return False
+
+
+def _load(session_id: str):
+    session = _memory.get(session_id)
+    if _disk is None:
+        return session
+    stored = _disk.get(session_id)
+    if stored is None:
+        return None
+    version, body = stored
+    if session is not None and session.version == version:
+        return session
+    session = Session(session_id, _conversation(body))
+    session.version = version
+    _remember(session)
+    return session
+
+
+def open_session(data: dict):
+    """Return the Session for a chat body, or None for stateless clients."""
+    if "session_id" not in data:
+        return None
+    session_id = data.get("session_id")
+    if isinstance(session_id, str) and _SESSION_ID.match(session_id):
+        session = _load(session_id)
+        if session is not None:
+            _stats["resumed"] += 1
+            return session
+        _stats["expired"] += 1
+
+    session = Session(uuid.uuid4().hex, chat_context.Conversation.from_history(data.get("history")))
+    _stats["created"] += 1
+    session.version = 1
+    _remember(session)
+    if _disk is not None:
+        _disk.put(session)
+    return session
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "active": len(_memory),
+        "bytes": _memory.bytes,
+        "shared": _disk is not None,
+    }
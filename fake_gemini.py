@@ -0,0 +1,230 @@
+"""A local stand-in for the Gemini API, for benchmarks and load tests.
+
+Answers the three calls the apps make, with no network or quota involved:
+
+* ``POST .../models/<model>:generateContent``
+* ``POST .../models/<model>:streamGenerateContent?alt=sse``
+* ``GET .../models/<model>`` (the health probe)
+
+Latency, response size and failures are configurable, so the apps can be
+measured against a slow, flaky or throttled upstream:
+
+    python fake_gemini.py --port 8089 --latency 1.5 --jitter 0.5
+    python fake_gemini.py --error-rate 0.02 --rate-limit-rate 0.05
+
+then start an app with
+GEMINI_URL=http://127.0.0.1:8089/v1beta/models/fake:generateContent?key=x.
+benchmark.py starts one automatically.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog while a model writes helpful "
+    "content about python seo marketing study plans and creative ideas"
+).split()
+
+
+class Settings:
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.3,
+        first_chunk: float = 0.3,
+        chunks: int = 8,
+        response_tokens: int = 300,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.first_chunk = first_chunk
+        self.chunks = chunks
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+    def delay(self) -> float:
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def text(self) -> str:
+        return " ".join(random.choice(WORDS) for _ in range(self.response_tokens))
+
+    def failure(self):
+        """Return (status, message) for an injected failure, or None."""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429, "Resource has been exhausted (e.g. check quota)."
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, "An internal error has occurred."
+        return None
+
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"generate": 0, "stream": 0, "model": 0, "errors": 0}
+
+    def inc(self, name: str):
+        with self._lock:
+            self.values[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.values)
+
+
+def _usage(text: str) -> dict:
+    completion = len(text) // 4
+    return {"promptTokenCount": 120, "candidatesTokenCount": completion, "totalTokenCount": 120 + completion}
+
+
+def _candidate(text: str) -> dict:
+    return {"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer each response into one write and send it at once, so timings
+    # are not skewed by Nagle/delayed-ACK stalls.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    settings = Settings()
+    counters = Counters()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.partition("?")[0]
+        if path == "/stats":
+            self._send_json(200, self.counters.snapshot())
+            return
+        self.counters.inc("model")
+        name = path.rsplit("/", 1)[-1]
+        self._send_json(200, {"name": f"models/{name}", "displayName": "Fake Gemini"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        path = self.path.partition("?")[0]
+        streaming = path.endswith(":streamGenerateContent")
+        if not streaming and not path.endswith(":generateContent"):
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        self.counters.inc("stream" if streaming else "generate")
+        failure = self.settings.failure()
+        if failure:
+            self.counters.inc("errors")
+            time.sleep(min(self.settings.delay(), 0.2))
+            status, message = failure
+            self._send_json(status, {"error": {"code": status, "message": message}})
+            return
+
+        text = self.settings.text()
+        if streaming:
+            self._stream(text)
+            return
+        time.sleep(self.settings.delay())
+        self._send_json(200, {"candidates": [_candidate(text)], "usageMetadata": _usage(text)})
+
+    def _stream(self, text: str):
+        """Send ``text`` as SSE events spread over the configured latency."""
+        settings = self.settings
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        count = max(1, settings.chunks)
+        size = -(-len(text) // count)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        gap = max(0.0, settings.delay() - settings.first_chunk) / len(pieces)
+        time.sleep(settings.first_chunk)
+        for i, piece in enumerate(pieces):
+            event = {"candidates": [_candidate(piece)]}
+            if i == len(pieces) - 1:
+                event["usageMetadata"] = _usage(text)
+            self._write_chunk(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+            if i < len(pieces) - 1:
+                time.sleep(gap)
+        self._write_chunk(b"")
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, settings: Settings = None) -> Server:
+    """Start the server on a background thread and return it."""
+    handler = type("BoundHandler", (Handler,), {
+        "settings": settings or Settings(),
+        "counters": Counters(),
+    })
+    server = Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-gemini").start()
+    return server
+
+
+def base_url(server: Server, model: str = "fake") -> str:
+    """The GEMINI_URL that points an app at ``server``."""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1beta/models/{model}:generateContent?key=fake-key"
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=1.0, help="mean seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.3, help="std deviation of the latency")
+    parser.add_argument("--first-chunk", type=float, default=0.3, help="seconds to the first SSE event")
+    parser.add_argument("--chunks", type=int, default=8, help="SSE events per streamed response")
+    parser.add_argument("--response-tokens", type=int, default=300, help="words per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered 429")
+
+
+def settings_from_args(args) -> Settings:
+    return Settings(
+        latency=args.latency,
+        jitter=args.jitter,
+        first_chunk=args.first_chunk,
+        chunks=args.chunks,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(args.host, args.port, settings_from_args(args))
+    print(f"Fake Gemini listening; GEMINI_URL={base_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Shared, pooled HTTP client for the Gemini API.
+
+Both app.py and app1.py send their Gemini calls through this module. Each
+gunicorn worker keeps a single requests.Session with a bounded keep-alive
+pool, so requests reuse open TCP/TLS connections to
+generativelanguage.googleapis.com instead of handshaking every time.
+
+Failed calls are retried (MAX_RETRIES) with backoff and ``Retry-After``, but
+never past the caller's ``timeout``: a retry whose wait would overrun it is
+skipped and the last response or error returned instead.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+BACKOFF_FACTOR = float(os.getenv("GEMINI_BACKOFF_FACTOR", "0.5"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+STATS_WINDOW = int(os.getenv("GEMINI_STATS_WINDOW", "200"))
+
+# call_gemini and the stream routes report upstream failures as text starting
+# with one of these, rather than raising.
+UPSTREAM_ERRORS = (
+    "API Error:", "Network error:", "AI request timed out",
+    "AI service temporarily unavailable", "AI service is busy",
+)
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+# Monotonic time by which the current call must be answered, set by post().
+_deadline = contextvars.ContextVar("gemini_deadline", default=None)
+
+
+class DeadlineRetry(Retry):
+    """Retry that gives up instead of sleeping past the current deadline."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        deadline = _deadline.get()
+        if deadline is not None:
+            wait = retry.get_backoff_time()
+            if response is not None and retry.respect_retry_after_header:
+                wait = retry.get_retry_after(response) or wait
+            if time.monotonic() + wait >= deadline:
+                raise MaxRetryError(_pool, url, error or ResponseError("retry would overrun the call deadline"))
+        return retry
+
+
+def _build_session() -> requests.Session:
+    # Read errors are not retried: a POST that timed out after READ_TIMEOUT
+    # should surface to the caller rather than wait another full timeout.
+    retry = DeadlineRetry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=POOL_SIZE,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return this process's session, rebuilding it after a fork."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class UpstreamStats:
+    """Rolling latency and error rate over the last ``window`` upstream calls."""
+
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "window": len(samples),
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000),
+            "latency_p95_ms": round(percentile(latencies, 95) * 1000),
+        }
+
+
+_stats = UpstreamStats(STATS_WINDOW)
+
+
+def post(url: str, payload: dict, stream: bool = False, timeout: float = None) -> requests.Response:
+    """POST to Gemini; ``timeout`` caps the read timeout below READ_TIMEOUT.
+
+    With a ``timeout``, retries and their backoff stop once the next attempt
+    could not start before it runs out.
+    """
+    start = time.monotonic()
+    read_timeout = min(timeout, READ_TIMEOUT) if timeout else READ_TIMEOUT
+    token = _deadline.set(start + timeout if timeout else None)
+    try:
+        response = get_session().post(
+            url,
+            json=payload,
+            timeout=(CONNECT_TIMEOUT, read_timeout),
+            stream=stream,
+        )
+    except requests.exceptions.RequestException:
+        _stats.record(time.monotonic() - start, False)
+        raise
+    finally:
+        _deadline.reset(token)
+    _stats.record(time.monotonic() - start, response.status_code not in RETRY_STATUSES)
+    return response
+
+
+def upstream_stats() -> dict:
+    return _stats.snapshot()
+
+
+def pool_stats() -> dict:
+    """Connection reuse counters for the current worker.
+
+    A "miss" is a request that had to open a new connection; every other
+    request (retries included) was served from the keep-alive pool.
+    """
+    session = _session if _session_pid == os.getpid() else None
+    num_requests = 0
+    num_connections = 0
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+    return {
+        "pool_size": POOL_SIZE,
+        "requests": num_requests,
+        "hits": max(num_requests - num_connections, 0),
+        "misses": num_connections,
+    }
+
+
+def model_url(url: str) -> str:
+    """The free model-metadata URL for a ``:generateContent`` URL."""
+    base, _, query = url.partition("?")
+    return f"{base.rsplit(':', 1)[0]}?{query}"
+
+
+def stream_url(url: str) -> str:
+    """Turn a ``:generateContent`` URL into its SSE streaming counterpart."""
+    return url.replace(":generateContent?", ":streamGenerateContent?alt=sse&", 1)
+
+
+def iter_sse(response: requests.Response):
+    """Yield each JSON object from a Gemini ``alt=sse`` response body."""
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data:"):
+            yield json.loads(line[5:].strip())
+
+
+def candidate_text(data: dict, sep: str = "") -> str:
+    """Join the text parts of the first candidate in a Gemini response."""
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return sep.join(part["text"] for part in parts if "text" in part)
@@ -0,0 +1,61 @@
+"""Gunicorn settings shared by app.py and app1.py.
+
+Pick a serving mode with SERVING_MODE:
+
+    sync      (default) one request per worker process
+    threaded  gthread workers, THREADS requests per process
+    async     gevent workers; slow Gemini calls yield instead of blocking, so
+              up to WORKER_CONNECTIONS requests (Gemini calls, chat streams
+              and static pages) share one process
+
+Bind address and worker count keep gunicorn's own defaults ($PORT and
+$WEB_CONCURRENCY), and command-line flags still override anything here.
+
+Workers record Prometheus samples in PROMETHEUS_MULTIPROC_DIR, which is
+wiped when gunicorn starts, so /metrics aggregates every live worker.
+
+The master builds the gzip/brotli variants of the static files once before
+forking; workers only read them (see static_assets.py).
+"""
+import os
+import shutil
+import tempfile
+import time
+
+SERVING_MODE = os.getenv("SERVING_MODE", "sync")
+
+if SERVING_MODE == "async":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+    # Upstream calls per process are capped by the Gemini connection pool;
+    # widen it so greenlets are not queued behind a sync-sized pool.
+    os.environ.setdefault("GEMINI_POOL_SIZE", os.getenv("GEMINI_MAX_IN_FLIGHT", "100"))
+elif SERVING_MODE == "threaded":
+    worker_class = "gthread"
+    threads = int(os.getenv("THREADS", "8"))
+    os.environ.setdefault("GEMINI_POOL_SIZE", str(threads))
+elif SERVING_MODE != "sync":
+    raise ValueError(f"Unknown SERVING_MODE: {SERVING_MODE}")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+METRICS_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "qwickgen-metrics")
+)
+
+
+def on_starting(server):
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    import static_assets
+
+    started = time.monotonic()
+    index = static_assets.index_site(precompress=True)
+    server.log.info("Precompressed %d static files in %.1fs", len(index), time.monotonic() - started)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,100 @@
+"""Liveness and readiness checks that never spend a Gemini completion.
+
+* ``/api/health/live`` answers from memory and touches nothing upstream.
+* ``/api/health/ready`` reports the result of a background probe that fetches
+  the model's metadata (a free call) every HEALTH_PROBE_INTERVAL seconds,
+  together with rolling latency/error stats of real traffic.
+
+Each worker process runs one probe thread, so upstream load is fixed no
+matter how many visitors load the page.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+
+import gemini_client
+import resilience
+
+PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "60"))
+PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "10"))
+MAX_ERROR_RATE = float(os.getenv("HEALTH_MAX_ERROR_RATE", "0.5"))
+
+_lock = threading.Lock()
+_gemini_url = None
+_probe_url = None
+_probe_pid = None
+_last_probe = {"ok": None, "checked_at": None, "latency_ms": None, "error": None}
+_started_at = time.time()
+
+
+def _probe_once():
+    start = time.monotonic()
+    try:
+        response = gemini_client.get_session().get(
+            _probe_url, timeout=(gemini_client.CONNECT_TIMEOUT, PROBE_TIMEOUT)
+        )
+        ok = response.status_code == 200
+        error = None if ok else f"HTTP {response.status_code}"
+    except requests.exceptions.RequestException as e:
+        ok, error = False, type(e).__name__
+    _last_probe.update({
+        "ok": ok,
+        "checked_at": time.time(),
+        "latency_ms": round((time.monotonic() - start) * 1000),
+        "error": error,
+    })
+
+
+def _probe_loop():
+    while True:
+        try:
+            _probe_once()
+        except Exception:
+            logging.exception("Health probe failed")
+        time.sleep(PROBE_INTERVAL)
+
+
+def start(gemini_url: str):
+    """Start this process's probe thread (again, if we were forked)."""
+    global _gemini_url, _probe_url, _probe_pid
+    with _lock:
+        _gemini_url = gemini_url
+        _probe_url = gemini_client.model_url(gemini_url)
+        if _probe_pid == os.getpid():
+            return
+        _probe_pid = os.getpid()
+        threading.Thread(target=_probe_loop, name="gemini-health-probe", daemon=True).start()
+
+
+def liveness() -> dict:
+    return {"status": "alive", "uptime_s": round(time.time() - _started_at)}
+
+
+def readiness():
+    """Return (body, ready) from the latest probe and rolling stats."""
+    if _gemini_url and _probe_pid != os.getpid():
+        start(_gemini_url)
+
+    stats = gemini_client.upstream_stats()
+    circuit = resilience.stats()["circuit"]
+    if _last_probe["ok"] is None:
+        status = "starting"
+    elif not _last_probe["ok"]:
+        status = "down"
+    elif circuit["state"] != resilience.CLOSED:
+        status = "degraded"
+    elif stats["window"] and stats["error_rate"] > MAX_ERROR_RATE:
+        status = "degraded"
+    else:
+        status = "ready"
+
+    body = {
+        "status": status,
+        "probe": dict(_last_probe),
+        "upstream": stats,
+        "circuit": circuit,
+    }
+    return body, status in ("ready", "starting", "degraded")
@@ -0,0 +1,190 @@
+"""Offline image optimization for images/.
+
+Builds resized WebP (and AVIF, where Pillow can write it) variants of every
+PNG/JPEG under images/ at a few widths, in parallel across a process pool:
+
+    python image_pipeline.py                 # default widths 480,960,1440
+    python image_pipeline.py --widths 640,1280 --workers 4
+    python image_pipeline.py --force         # rebuild everything
+
+Outputs go to images/optimized/ with the source content hash in the file
+name, so they can be cached as immutable. images/optimized/manifest.json
+records each source's hash, size, requested widths and variants; on the next
+run only sources whose hash, widths or formats changed are rebuilt, and files
+of removed or changed sources are deleted. static_assets.py reads the
+manifest to pick a variant per request, and site_build.py to write
+``srcset``.
+
+Requires Pillow; AVIF output also needs Pillow >= 11.2 or pillow-avif-plugin.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(ROOT, "images")
+OUT_DIR = os.path.join(IMAGES_DIR, "optimized")
+MANIFEST = os.path.join(OUT_DIR, "manifest.json")
+SOURCE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+DEFAULT_WIDTHS = (480, 960, 1440)
+QUALITY = {"webp": 80, "avif": 55}
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _register_avif():
+    try:
+        import pillow_avif  # noqa: F401  registers the AVIF plugin on older Pillow
+    except ImportError:
+        pass
+
+
+def available_formats() -> list:
+    from PIL import Image
+
+    _register_avif()
+    Image.init()
+    formats = ["webp"]
+    if "AVIF" in Image.SAVE:
+        formats.append("avif")
+    return formats
+
+
+def _process(job: tuple) -> tuple:
+    """Build every variant of one source image. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    rel, digest, widths, formats = job
+    if "avif" in formats:
+        _register_avif()
+
+    stem = os.path.splitext(os.path.basename(rel))[0].replace(" ", "-")
+    variants = []
+    with Image.open(os.path.join(ROOT, rel)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        width, height = image.size
+
+        for target in sorted({min(w, width) for w in widths}):
+            if target == width:
+                resized = image
+            else:
+                resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+            for fmt in formats:
+                name = f"{stem}-{digest[:10]}-{target}.{fmt}"
+                path = os.path.join(OUT_DIR, name)
+                options = {"quality": QUALITY[fmt]}
+                if fmt == "webp":
+                    options["method"] = 6
+                resized.save(path, fmt.upper(), **options)
+                variants.append({
+                    "width": target,
+                    "height": resized.size[1],
+                    "format": fmt,
+                    "file": f"images/optimized/{name}",
+                    "bytes": os.path.getsize(path),
+                })
+
+    return rel, {
+        "hash": digest,
+        "widths": sorted(widths),
+        "width": width,
+        "height": height,
+        "bytes": os.path.getsize(os.path.join(ROOT, rel)),
+        "variants": variants,
+    }
+
+
+def _sources() -> dict:
+    """Map each source image (path relative to ROOT) to its content hash."""
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(IMAGES_DIR):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != OUT_DIR]
+        for name in filenames:
+            if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS:
+                path = os.path.join(dirpath, name)
+                sources[os.path.relpath(path, ROOT).replace(os.sep, "/")] = _hash_file(path)
+    return sources
+
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove_outputs(entry: dict):
+    for variant in entry.get("variants", []):
+        try:
+            os.remove(os.path.join(ROOT, variant["file"]))
+        except FileNotFoundError:
+            pass
+
+
+def build(widths=DEFAULT_WIDTHS, workers: int = None, force: bool = False) -> dict:
+    os.makedirs(OUT_DIR, exist_ok=True)
+    formats = available_formats()
+    manifest = load_manifest()
+    sources = _sources()
+
+    for rel in set(manifest) - set(sources):
+        _remove_outputs(manifest.pop(rel))
+
+    jobs = []
+    for rel, digest in sorted(sources.items()):
+        entry = manifest.get(rel)
+        current = (
+            entry
+            and entry["hash"] == digest
+            and entry.get("widths") == sorted(widths)
+            and sorted({v["format"] for v in entry["variants"]}) == sorted(formats)
+        )
+        if force or not current:
+            if entry:
+                _remove_outputs(entry)
+            jobs.append((rel, digest, tuple(widths), tuple(formats)))
+
+    print(f"{len(sources)} images, {len(jobs)} to build ({', '.join(formats)})")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_process, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                rel, entry = future.result()
+            except Exception as e:
+                print(f"  failed: {e}", file=sys.stderr)
+                continue
+            manifest[rel] = entry
+            best = min(v["bytes"] for v in entry["variants"])
+            print(f"  {rel}: {entry['bytes'] // 1024} KB -> {best // 1024} KB smallest")
+
+    tmp = MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--widths", default=",".join(map(str, DEFAULT_WIDTHS)))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    widths = [int(w) for w in args.widths.split(",") if w]
+    build(widths, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
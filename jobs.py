@@ -0,0 +1,299 @@
+"""Asynchronous generation jobs for long-form tools.
+
+``POST /api/jobs`` takes the same body as /api/generate, queues it and
+answers 202 with a job id at once. The client then polls
+``GET /api/jobs/<id>``, which returns ``queued``, ``running``, ``done`` (with
+the result) or ``failed``, so slow tools such as blog, docs or research never
+hold a request open past proxy or browser timeouts.
+
+* Each worker process runs JOBS_WORKERS threads over a bounded priority
+  queue (JOBS_MAX_QUEUED). Short tools go first; long-form jobs give way to
+  them for at most JOBS_LONG_DELAY seconds, so they are never starved.
+* A running job holds an admission in-flight lease, like a request does, so
+  jobs count against GLOBAL_MAX_IN_FLIGHT. While the cap is full, jobs stay
+  queued and are retried every JOBS_CAPACITY_RETRY seconds.
+* Jobs and results live in a SQLite file (JOBS_DB) shared by every gunicorn
+  worker, so a poll can land on any of them. Set JOBS_DB to an empty string
+  to keep jobs per process instead.
+* Results are kept for JOBS_TTL seconds. Re-submitting the same request, or
+  the same ``Idempotency-Key``, while its job is queued, running or done
+  returns the existing job instead of calling Gemini again.
+* A job whose worker died (no update for JOBS_STALE_AFTER seconds) is
+  reported as failed, so it can be submitted again.
+"""
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import admission
+from gemini_client import UPSTREAM_ERRORS
+from sqlite_db import Database
+
+WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "50"))
+TTL = float(os.getenv("JOBS_TTL", "3600"))
+STALE_AFTER = float(os.getenv("JOBS_STALE_AFTER", "600"))
+LONG_DELAY = float(os.getenv("JOBS_LONG_DELAY", "30"))
+CAPACITY_RETRY = float(os.getenv("JOBS_CAPACITY_RETRY", "1"))
+DB_PATH = os.getenv("JOBS_DB", os.path.join(tempfile.gettempdir(), "qwickgen-jobs.db"))
+
+# How long each tool class yields to the others in the queue.
+CLASS_DELAY = {"short": 0.0, "chat": 0.0, "long": LONG_DELAY}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+COLUMNS = ("id", "dedupe", "tool", "status", "result", "created", "updated", "expires")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _purge(self, now: float):
+        self._jobs = {k: v for k, v in self._jobs.items() if v["expires"] > now}
+
+    def create(self, job: dict) -> dict:
+        """Insert ``job`` unless a live job with its dedupe key exists; return the one kept."""
+        with self._lock:
+            self._purge(job["created"])
+            if job["dedupe"]:
+                for existing in self._jobs.values():
+                    if existing["dedupe"] == job["dedupe"] and _reusable(existing, job["created"]):
+                        return dict(existing)
+            self._jobs[job["id"]] = dict(job)
+            return job
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job and job["expires"] > time.time() else None
+
+
+class SQLiteStore:
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str):
+        self.db = Database(
+            path,
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id TEXT PRIMARY KEY, dedupe TEXT, tool TEXT, status TEXT NOT NULL, result TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL, expires REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe)",
+        )
+        self._writes = 0
+
+    @staticmethod
+    def _row(row) -> dict:
+        job = dict(zip(COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, job: dict) -> dict:
+        with self.db.transaction() as conn:
+            if job["dedupe"]:
+                rows = conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE dedupe = ? AND expires > ?",
+                    (job["dedupe"], job["created"]),
+                ).fetchall()
+                for row in rows:
+                    existing = self._row(row)
+                    if _reusable(existing, job["created"]):
+                        return existing
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                tuple(json.dumps(job[c]) if c == "result" and job[c] else job[c] for c in COLUMNS),
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.db.execute("DELETE FROM jobs WHERE expires <= ?", (time.time(),))
+        return job
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        rows = self.db.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ? AND expires > ?",
+            (job_id, time.time()),
+        )
+        return self._row(rows[0]) if rows else None
+
+
+def _stale(job: dict, now: float) -> bool:
+    return job["status"] in (QUEUED, RUNNING) and now - job["updated"] > STALE_AFTER
+
+
+def _reusable(job: dict, now: float) -> bool:
+    return job["status"] != FAILED and not _stale(job, now)
+
+
+class JobQueue:
+    """Bounded priority queue drained by this process's worker threads."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._pid = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.capacity_waits = 0
+
+    def _ensure_workers(self):
+        # Threads do not survive a fork; start them in the process that serves.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._heap = []
+            for i in range(WORKERS):
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+    def put(self, job_id: str, tool_id: str, item: dict, run_item):
+        ready_at = time.monotonic() + CLASS_DELAY[admission.tool_class(tool_id)]
+        with self._cond:
+            self._ensure_workers()
+            if len(self._heap) >= MAX_QUEUED:
+                raise QueueFull()
+            context = contextvars.copy_context()
+            heapq.heappush(self._heap, (ready_at, next(self._seq), job_id, item, run_item, context))
+            self._cond.notify()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                entry = heapq.heappop(self._heap)
+            leases = admission.acquire()
+            if leases is None:
+                with self._cond:
+                    heapq.heappush(self._heap, entry)
+                    self.capacity_waits += 1
+                time.sleep(CAPACITY_RETRY)
+                continue
+
+            _, _, job_id, item, run_item, context = entry
+            with self._cond:
+                self.running += 1
+            try:
+                context.run(_run, job_id, item, run_item)
+            finally:
+                admission.release(leases)
+                with self._cond:
+                    self.running -= 1
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+
+def _run(job_id: str, item: dict, run_item):
+    _store.update(job_id, status=RUNNING, updated=time.time())
+    try:
+        result = run_item(item)
+    except Exception as e:
+        logging.exception("Job %s failed", job_id)
+        result = {"success": False, "error": str(e)}
+
+    content = result.get("content") or ""
+    failed = not result.get("success", True) or content.startswith(UPSTREAM_ERRORS)
+    if failed:
+        _queue.failed += 1
+        result = {"success": False, "error": result.get("error") or content}
+    else:
+        _queue.completed += 1
+    _store.update(job_id, status=FAILED if failed else DONE, result=result, updated=time.time())
+
+
+_store = SQLiteStore(DB_PATH) if DB_PATH else MemoryStore()
+_queue = JobQueue()
+
+
+def dedupe_key(idempotency_key: str, cache_key: str):
+    if idempotency_key:
+        return "idem:" + hashlib.sha256(idempotency_key.encode("utf-8")).hexdigest()
+    return cache_key
+
+
+def submit(item: dict, run_item, dedupe: str = None) -> tuple:
+    """Queue ``run_item(item)`` and return (job, created).
+
+    An existing live job with the same ``dedupe`` key is returned instead,
+    with ``created`` False. Raises QueueFull when this process is saturated.
+    """
+    now = time.time()
+    tool_id = item.get("tool")
+    job = {
+        "id": uuid.uuid4().hex,
+        "dedupe": dedupe,
+        "tool": tool_id,
+        "status": QUEUED,
+        "result": None,
+        "created": now,
+        "updated": now,
+        "expires": now + TTL,
+    }
+    kept = _store.create(job)
+    if kept["id"] != job["id"]:
+        return kept, False
+    try:
+        _queue.put(job["id"], tool_id, item, run_item)
+    except QueueFull:
+        _store.update(job["id"], status=FAILED, result={"success": False, "error": "Job queue is full"})
+        raise
+    return job, True
+
+
+def get(job_id: str):
+    job = _store.get(job_id)
+    if job and _stale(job, time.time()):
+        job["status"] = FAILED
+        job["result"] = {"success": False, "error": "The job was lost. Please submit it again."}
+    return job
+
+
+def describe(job: dict) -> dict:
+    """Public view of a job for the API."""
+    body = {
+        "id": job["id"],
+        "tool": job["tool"],
+        "status": job["status"],
+        "created_at": round(job["created"], 3),
+    }
+    if job["status"] == DONE:
+        body["result"] = job["result"]
+    elif job["status"] == FAILED:
+        body["error"] = (job["result"] or {}).get("error", "Job failed")
+    return body
+
+
+def stats() -> dict:
+    return {
+        "shared": isinstance(_store, SQLiteStore),
+        "workers": WORKERS,
+        "queued": _queue.depth(),
+        "running": _queue.running,
+        "completed": _queue.completed,
+        "failed": _queue.failed,
+        "capacity_waits": _queue.capacity_waits,
+    }
@@ -0,0 +1,148 @@
+"""Logging setup shared by app.py and app1.py.
+
+* Request threads only put records on a queue; a background listener
+  formats and writes them, so handlers never block on log I/O.
+* LOG_FORMAT=json writes one JSON object per line with a timestamp, level,
+  message, the request id and any structured fields passed via ``extra``.
+  The default, ``text``, keeps the classic single-line format.
+* Every request gets an id (the incoming X-Request-ID header, or a new one),
+  echoed back in the response and attached to each log line, plus one
+  access line with its status and duration.
+* Full Gemini response bodies are logged only for a LOG_PAYLOAD_SAMPLE_RATE
+  fraction of calls; every call still gets a one-line summary.
+* The Gemini API key is redacted from everything that is written.
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+import uuid
+
+from flask import g, request
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+_KEY_PATTERN = re.compile(r"(key=)[A-Za-z0-9_\-]+")
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+_listener = None
+
+
+def redact(text: str) -> str:
+    text = _KEY_PATTERN.sub(r"\1[REDACTED]", text)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        text = text.replace(api_key, "[REDACTED]")
+    return text
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return redact(json.dumps(entry, default=str))
+
+
+def configure():
+    """Route the root logger through a queue to a background writer."""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(RedactingFormatter(
+            "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+        ))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def log_upstream(tool_id, status: int, duration: float, data: dict = None):
+    """One summary line per Gemini call, plus the full body when sampled."""
+    logging.info(
+        "Gemini response status: %s",
+        status,
+        extra={"tool": tool_id, "upstream_status": status, "upstream_ms": round(duration * 1000)},
+    )
+    if data is not None and PAYLOAD_SAMPLE_RATE and random.random() < PAYLOAD_SAMPLE_RATE:
+        logging.info("Gemini response body: %s", data, extra={"tool": tool_id, "sampled": True})
+
+
+def _before_request():
+    rid = request.headers.get("X-Request-ID", "")[:64] or uuid.uuid4().hex
+    g.request_id = rid
+    request_id_var.set(rid)
+    g.log_start = time.perf_counter()
+
+
+def _after_request(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "-")
+    g.log_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    start = g.pop("log_start", None)
+    if start is None:
+        return
+    logging.getLogger("access").info(
+        "%s %s %s",
+        request.method,
+        request.path,
+        g.get("log_status", 500),
+        extra={
+            "method": request.method,
+            "path": request.path,
+            "status": g.get("log_status", 500),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        },
+    )
+    request_id_var.set("-")
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
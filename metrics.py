@@ -0,0 +1,180 @@
+"""Prometheus metrics for the API, exposed at /metrics.
+
+Covers request counts and handler latency per endpoint and tool, Gemini
+upstream latency per tool, outcome (ok, rate_limited, error, timeout,
+circuit_open) and grounding (whether Google Search was attached), hedged
+requests, circuit breaker state, token usage from Gemini's
+``usageMetadata``, prompt/response sizes and in-flight gauges.
+
+Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a shared
+directory, so every worker writes its samples there and /metrics reports the
+sum over all workers. Without it (``python app.py``) the process serves its
+own registry.
+"""
+import os
+import time
+
+import requests
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled.", ["endpoint", "tool", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Total handler time, including streaming.",
+    ["endpoint", "tool"], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled.", ["endpoint"],
+    multiprocess_mode="livesum",
+)
+GEMINI_REQUESTS = Counter(
+    "gemini_requests_total", "Upstream Gemini calls.", ["tool", "outcome"]
+)
+GEMINI_LATENCY = Histogram(
+    "gemini_request_duration_seconds", "Upstream Gemini call latency.",
+    ["tool", "outcome", "grounded"], buckets=LATENCY_BUCKETS,
+)
+GEMINI_IN_FLIGHT = Gauge(
+    "gemini_requests_in_flight", "Upstream Gemini calls in progress.",
+    multiprocess_mode="livesum",
+)
+GEMINI_HEDGES = Counter(
+    "gemini_hedged_requests_total", "Backup calls fired for slow short tools, and how many won.",
+    ["tool", "result"],
+)
+GEMINI_CIRCUIT_OPEN = Gauge(
+    "gemini_circuit_open", "1 while the Gemini circuit breaker is open.",
+    multiprocess_mode="livemax",
+)
+GEMINI_TOKENS = Counter(
+    "gemini_tokens_total", "Tokens reported by Gemini usageMetadata.", ["tool", "kind"]
+)
+GEMINI_PROMPT_BYTES = Histogram(
+    "gemini_prompt_bytes", "Size of the prompt sent upstream.", ["tool"], buckets=SIZE_BUCKETS,
+)
+GEMINI_RESPONSE_BYTES = Histogram(
+    "gemini_response_bytes", "Size of the upstream response body.", ["tool"], buckets=SIZE_BUCKETS,
+)
+
+USAGE_FIELDS = {
+    "promptTokenCount": "prompt",
+    "candidatesTokenCount": "completion",
+    "thoughtsTokenCount": "thoughts",
+    "totalTokenCount": "total",
+}
+
+_known_tools = ()
+
+
+def tool_label(tool_id) -> str:
+    """Keep label cardinality bounded to the configured tool ids."""
+    return tool_id if tool_id in _known_tools else "unknown"
+
+
+def payload_bytes(payload: dict) -> int:
+    return sum(
+        len(part.get("text", ""))
+        for content in payload.get("contents", [])
+        for part in content.get("parts", [])
+    )
+
+
+class UpstreamCall:
+    """Times one Gemini call; use as ``with metrics.upstream(...) as call``."""
+
+    def __init__(self, tool_id, payload: dict):
+        self.tool = tool_label(tool_id)
+        self.prompt_bytes = payload_bytes(payload)
+        self.grounded = "true" if payload.get("tools") else "false"
+        self.outcome = "error"
+
+    def __enter__(self):
+        GEMINI_IN_FLIGHT.inc()
+        GEMINI_PROMPT_BYTES.labels(self.tool).observe(self.prompt_bytes)
+        self.start = time.perf_counter()
+        return self
+
+    def finish(self, status: int, usage: dict = None, response_bytes: int = None):
+        if status == 200:
+            self.outcome = "ok"
+        elif status == 429:
+            self.outcome = "rate_limited"
+        for field, kind in USAGE_FIELDS.items():
+            if usage and usage.get(field):
+                GEMINI_TOKENS.labels(self.tool, kind).inc(usage[field])
+        if response_bytes is not None:
+            GEMINI_RESPONSE_BYTES.labels(self.tool).observe(response_bytes)
+
+    def __exit__(self, exc_type, exc, tb):
+        GEMINI_IN_FLIGHT.dec()
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None and issubclass(exc_type, requests.exceptions.Timeout):
+            self.outcome = "timeout"
+        elif exc_type is not None:
+            self.outcome = getattr(exc_type, "outcome", "error")
+        GEMINI_LATENCY.labels(self.tool, self.outcome, self.grounded).observe(self.duration)
+        GEMINI_REQUESTS.labels(self.tool, self.outcome).inc()
+        return False
+
+
+def upstream(tool_id, payload: dict) -> UpstreamCall:
+    return UpstreamCall(tool_id, payload)
+
+
+def _before_request():
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    tool = None
+    if request.method == "POST" and request.path.startswith("/api/"):
+        data = request.get_json(force=True, silent=True)
+        if isinstance(data, dict):
+            tool = data.get("tool")
+    g.metrics = (endpoint, tool_label(tool) if tool else "none", time.perf_counter())
+    HTTP_IN_FLIGHT.labels(endpoint).inc()
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    state = g.pop("metrics", None)
+    if state is None:
+        return
+    endpoint, tool, start = state
+    status = g.pop("metrics_status", 500)
+    HTTP_IN_FLIGHT.labels(endpoint).dec()
+    HTTP_LATENCY.labels(endpoint, tool).observe(time.perf_counter() - start)
+    HTTP_REQUESTS.labels(endpoint, tool, str(status)).inc()
+
+
+def metrics_view():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, templates):
+    global _known_tools
+    _known_tools = templates
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
@@ -0,0 +1,203 @@
+"""Shared prompt template registry for app.py and app1.py.
+
+Templates live in prompt_templates.json (or PROMPT_TEMPLATES_FILE). Each app
+loads a profile from it: the list of tool ids it exposes plus any per-app
+overrides, such as the GYRA persona. Templates are validated and compiled
+once, when loaded:
+
+* the format string is split into literal and field parts, so rendering is
+  a single join instead of a ``str.format`` parse per request
+* the ``"{system}\\n\\nUser: "`` prefix sent to Gemini is built ahead of time
+* each template gets a version hash that response caches key on
+* request options are prepared per tool: Google Search grounding
+  (``"grounding": true``) and a Gemini ``generationConfig``
+  (``"generation": {"temperature": ..., "maxOutputTokens": ...}``), with
+  defaults per profile
+
+The file is re-checked at most every PROMPT_RELOAD_INTERVAL seconds and
+reloaded in place when it changes. A file that fails validation is logged
+and ignored, and the last good templates stay live.
+"""
+import hashlib
+import json
+import logging
+import os
+import string
+import threading
+import time
+
+TEMPLATES_FILE = os.getenv(
+    "PROMPT_TEMPLATES_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_templates.json"),
+)
+RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "5"))
+FIELDS = ("input", "target")
+GENERATION_FIELDS = ("temperature", "topP", "topK", "maxOutputTokens", "stopSequences")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    __slots__ = (
+        "tool_id", "system", "template", "cache", "grounding", "generation", "options",
+        "version", "prefix", "uses_target", "_parts",
+    )
+
+    def __init__(self, tool_id: str, spec: dict):
+        try:
+            self.system = spec["system"]
+            self.template = spec["template"]
+        except KeyError as e:
+            raise TemplateError(f"{tool_id}: missing {e.args[0]!r}")
+        self.tool_id = tool_id
+        self.cache = spec.get("cache", True)
+        self.grounding, self.generation = _validate_options(tool_id, spec)
+        self.options = _request_options(self.grounding, self.generation)
+        self.prefix = f"{self.system}\n\nUser: "
+        self._parts = self._compile(tool_id, self.template)
+        self.uses_target = any(field == "target" for _, field in self._parts)
+        digest = hashlib.sha256(
+            json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        )
+        self.version = digest.hexdigest()[:12]
+
+    @staticmethod
+    def _compile(tool_id: str, template: str) -> tuple:
+        """Split the template into (literal, field) pairs, validating fields."""
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as e:
+            raise TemplateError(f"{tool_id}: {e}")
+        parts = []
+        for literal, field, spec, conversion in parsed:
+            if field is not None and (field not in FIELDS or spec or conversion):
+                raise TemplateError(f"{tool_id}: unsupported placeholder {{{field}}}")
+            parts.append((literal, field))
+        if not any(field == "input" for _, field in parts):
+            raise TemplateError(f"{tool_id}: template has no {{input}} placeholder")
+        return tuple(parts)
+
+    def render(self, user_input: str, target: str = "") -> str:
+        # Like str.format, accept any JSON value, e.g. "target": 5 or null.
+        values = {"input": str(user_input), "target": str(target), None: ""}
+        return "".join([text for literal, field in self._parts for text in (literal, values[field])])
+
+
+def _validate_options(tool_id: str, spec: dict) -> tuple:
+    grounding = spec.get("grounding", False)
+    generation = spec.get("generation", {})
+    if not isinstance(grounding, bool):
+        raise TemplateError(f"{tool_id}: grounding must be true or false")
+    if not isinstance(generation, dict):
+        raise TemplateError(f"{tool_id}: generation must be an object")
+    unknown = set(generation) - set(GENERATION_FIELDS)
+    if unknown:
+        raise TemplateError(f"{tool_id}: unsupported generation settings {sorted(unknown)}")
+    return grounding, generation
+
+
+def _request_options(grounding: bool, generation: dict) -> dict:
+    """The payload fields, besides ``contents``, that a tool sends to Gemini."""
+    options = {}
+    if grounding:
+        options["tools"] = [{"google_search": {}}]
+    if generation:
+        options["generationConfig"] = dict(generation)
+    return options
+
+
+def _merge(*layers: dict) -> dict:
+    """Merge template settings; ``generation`` is merged key by key."""
+    spec = {}
+    for layer in layers:
+        for key, value in layer.items():
+            if key == "generation" and isinstance(value, dict):
+                value = {**spec.get("generation", {}), **value}
+            spec[key] = value
+    return spec
+
+
+class TemplateRegistry:
+    """Read-only mapping of tool id to Template for one app profile."""
+
+    def __init__(self, profile: str, path: str = TEMPLATES_FILE):
+        self.profile = profile
+        self.path = path
+        self.version = None
+        self._templates = {}
+        self._prefixes = {}
+        self._default_options = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, encoding="utf-8") as f:
+            raw = f.read()
+        doc = json.loads(raw)
+
+        profile = doc["profiles"][self.profile]
+        overrides = profile.get("overrides", {})
+        defaults = profile.get("defaults", {})
+        templates = {}
+        for tool_id in profile["tools"]:
+            if tool_id not in doc["templates"]:
+                raise TemplateError(f"{self.profile}: unknown tool {tool_id!r}")
+            spec = _merge(defaults, doc["templates"][tool_id], overrides.get(tool_id, {}))
+            templates[tool_id] = Template(tool_id, spec)
+
+        self._templates = templates
+        self._prefixes = {tpl.system: tpl.prefix for tpl in templates.values()}
+        self._default_options = _request_options(*_validate_options(self.profile, defaults))
+        self.version = f"{doc.get('version', 0)}-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:8]}"
+        self._mtime = mtime
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked < RELOAD_INTERVAL:
+                return
+            self._checked = now
+            try:
+                if os.stat(self.path).st_mtime_ns != self._mtime:
+                    self._load()
+                    logging.info("Reloaded prompt templates %s (version %s)", self.path, self.version)
+            except (OSError, ValueError, KeyError) as e:
+                logging.error("Keeping previous prompt templates, reload failed: %s", e)
+
+    def __contains__(self, tool_id) -> bool:
+        self._maybe_reload()
+        return tool_id in self._templates
+
+    def __getitem__(self, tool_id) -> Template:
+        self._maybe_reload()
+        return self._templates[tool_id]
+
+    def __iter__(self):
+        return iter(self._templates)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def user_text(self, system_message: str, prompt: str) -> str:
+        """The single user turn sent to Gemini: system prompt, then the prompt."""
+        prefix = self._prefixes.get(system_message)
+        if prefix is None:
+            return f"{system_message}\n\nUser: {prompt}"
+        return prefix + prompt
+
+    def options(self, tool_id) -> dict:
+        """Request options for ``tool_id``, or the profile defaults."""
+        self._maybe_reload()
+        tpl = self._templates.get(tool_id)
+        return tpl.options if tpl else self._default_options
+
+
+def load(profile: str) -> TemplateRegistry:
+    return TemplateRegistry(profile)
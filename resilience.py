@@ -0,0 +1,316 @@
+"""Circuit breaker, per-tool deadlines and hedged requests for Gemini calls.
+
+``resilience.post`` wraps ``gemini_client.post`` for both apps:
+
+* Deadlines: each call gets a read timeout from its tool instead of one
+  global 60s. Defaults come from the tool class (GEMINI_DEADLINE_SHORT,
+  GEMINI_DEADLINE_CHAT, GEMINI_DEADLINE_LONG). A call whose generationConfig
+  allows more than GEMINI_LONG_OUTPUT_TOKENS output tokens (the gyra profile
+  asks for 8192) gets at least the long deadline, whatever its class.
+  GEMINI_TOOL_DEADLINES overrides single tools, e.g. ``title=10,meta=10``.
+* Circuit breaker: over the last CIRCUIT_WINDOW calls, once at least
+  CIRCUIT_MIN_CALLS were made and either the error rate reaches
+  CIRCUIT_ERROR_RATE or the share of slow calls (those that used more than
+  CIRCUIT_SLOW_CALL_RATIO of their own deadline) reaches
+  CIRCUIT_SLOW_CALL_RATE, the circuit opens and calls fail at once with
+  CircuitOpenError. After CIRCUIT_OPEN_SECONDS it
+  lets CIRCUIT_HALF_OPEN_PROBES calls through; if they succeed it closes,
+  otherwise it opens again. A 429 is quota back-pressure, not an outage, so
+  it counts neither way.
+* Hedging: for HEDGED_TOOLS (short outputs such as title, meta, tweet), a
+  second identical call is fired if the first has not answered within the
+  tool's recent HEDGE_PERCENTILE latency, and whichever answers first wins.
+  Hedges are capped at HEDGE_MAX_RATIO of calls and only sent while the
+  circuit is closed, so they never pile onto a struggling upstream.
+
+State is per worker process, like the connection pool.
+"""
+import contextvars
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import requests
+
+import admission
+import gemini_client
+import metrics
+
+LONG_OUTPUT_TOKENS = int(os.getenv("GEMINI_LONG_OUTPUT_TOKENS", "2048"))
+DEADLINES = {
+    "short": float(os.getenv("GEMINI_DEADLINE_SHORT", "20")),
+    "chat": float(os.getenv("GEMINI_DEADLINE_CHAT", "30")),
+    "long": float(os.getenv("GEMINI_DEADLINE_LONG", "60")),
+}
+TOOL_DEADLINES = {
+    tool: float(seconds)
+    for tool, _, seconds in (
+        item.partition("=")
+        for item in os.getenv("GEMINI_TOOL_DEADLINES", "title=10,meta=10,tweet=10").split(",")
+        if "=" in item
+    )
+}
+
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "50"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_RATIO = float(os.getenv("CIRCUIT_SLOW_CALL_RATIO", "0.8"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "2"))
+
+HEDGED_TOOLS = set(filter(None, os.getenv("HEDGED_TOOLS", "title,meta,tweet").split(",")))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "3"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    # Read by metrics.UpstreamCall as the outcome label.
+    outcome = "circuit_open"
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Gemini circuit open, retry in {math.ceil(retry_after)}s")
+
+
+def deadline(tool_id, payload: dict = None) -> float:
+    """Read timeout for a call to ``tool_id`` sending ``payload``."""
+    if tool_id in TOOL_DEADLINES:
+        return TOOL_DEADLINES[tool_id]
+    seconds = DEADLINES[admission.tool_class(tool_id)]
+    max_tokens = ((payload or {}).get("generationConfig") or {}).get("maxOutputTokens") or 0
+    if max_tokens > LONG_OUTPUT_TOKENS:
+        seconds = max(seconds, DEADLINES["long"])
+    return seconds
+
+
+def is_failure(status: int) -> bool:
+    """Whether ``status`` counts against the circuit."""
+    return status in gemini_client.RETRY_STATUSES and status != 429
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=CIRCUIT_WINDOW)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Admit a call or raise CircuitOpenError. Returns True for a probe."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + CIRCUIT_OPEN_SECONDS - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(remaining)
+                self._set_state(HALF_OPEN)
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= CIRCUIT_HALF_OPEN_PROBES:
+                    self.rejected += 1
+                    raise CircuitOpenError(1)
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, ok, latency: float, probe: bool = False, timeout: float = None):
+        """Record a call; ``ok`` None (back-pressure) only frees its probe slot.
+
+        The call counts as slow once ``latency`` passes CIRCUIT_SLOW_CALL_RATIO
+        of ``timeout``, its own deadline.
+        """
+        with self._lock:
+            if probe:
+                self._probes = max(self._probes - 1, 0)
+                if ok is None:
+                    return
+                if ok:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._open()
+                return
+            if ok is None:
+                return
+
+            slow = timeout is not None and latency >= CIRCUIT_SLOW_CALL_RATIO * timeout
+            self._calls.append((ok, slow))
+            if self.state != CLOSED or len(self._calls) < CIRCUIT_MIN_CALLS:
+                return
+            errors = sum(1 for ok, _ in self._calls if not ok)
+            slow = sum(1 for _, is_slow in self._calls if is_slow)
+            if (
+                errors / len(self._calls) >= CIRCUIT_ERROR_RATE
+                or slow / len(self._calls) >= CIRCUIT_SLOW_CALL_RATE
+            ):
+                self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.opened += 1
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.GEMINI_CIRCUIT_OPEN.set(1 if state == OPEN else 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "window": len(self._calls),
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class Hedger:
+    """Tracks per-tool latency to decide when a backup call is worth it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def observe(self, tool_id: str, latency: float):
+        with self._lock:
+            self._latencies.setdefault(tool_id, deque(maxlen=200)).append(latency)
+
+    def delay(self, tool_id: str) -> float:
+        with self._lock:
+            samples = sorted(self._latencies.get(tool_id, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, gemini_client.percentile(samples, HEDGE_PERCENTILE))
+
+    def start_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def won(self):
+        with self._lock:
+            self.wins += 1
+
+    def try_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > HEDGE_MAX_RATIO * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "tools": sorted(HEDGED_TOOLS),
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.wins,
+            }
+
+
+_breaker = CircuitBreaker()
+_hedger = Hedger()
+
+
+def _start(results: queue.Queue, name: str, url: str, payload: dict, timeout: float):
+    def attempt():
+        try:
+            results.put((name, gemini_client.post(url, payload, timeout=timeout), None))
+        except Exception as e:
+            results.put((name, None, e))
+
+    threading.Thread(
+        target=contextvars.copy_context().run, args=(attempt,), name=f"gemini-{name}", daemon=True
+    ).start()
+
+
+def _hedged_post(url: str, payload: dict, tool_id: str, timeout: float) -> requests.Response:
+    """Send the call, plus one backup if it is slow; return the first good answer."""
+    _hedger.start_call()
+    results = queue.Queue()
+    started = time.monotonic()
+    _start(results, "primary", url, payload, timeout)
+    pending = 1
+    hedge_at = started + _hedger.delay(tool_id)
+    hedged = False
+    last_error = last_response = None
+
+    while pending:
+        now = time.monotonic()
+        if not hedged and now < hedge_at:
+            wait = hedge_at - now
+        else:
+            wait = max(started + timeout - now, 0)
+        try:
+            name, response, error = results.get(timeout=wait)
+        except queue.Empty:
+            if not hedged and _breaker.state == CLOSED and _hedger.try_hedge():
+                hedged = True
+                pending += 1
+                metrics.GEMINI_HEDGES.labels(metrics.tool_label(tool_id), "fired").inc()
+                _start(results, "hedge", url, payload, max(started + timeout - time.monotonic(), 0.1))
+                continue
+            if not hedged:
+                hedged = True
+                continue
+            raise requests.exceptions.ReadTimeout(f"Gemini call exceeded its {timeout:g}s deadline")
+
+        pending -= 1
+        if response is not None and response.status_code not in gemini_client.RETRY_STATUSES:
+            if name == "hedge":
+                _hedger.won()
+                metrics.GEMINI_HEDGES.labels(metrics.tool_label(tool_id), "won").inc()
+            return response
+        if response is not None:
+            last_response = response
+        last_error = error
+
+    if last_response is not None:
+        return last_response
+    raise last_error
+
+
+def post(url: str, payload: dict, tool_id: str = None, stream: bool = False) -> requests.Response:
+    """``gemini_client.post`` behind the breaker, with the tool's deadline."""
+    probe = _breaker.allow()
+    timeout = deadline(tool_id, payload)
+    start = time.monotonic()
+    try:
+        if tool_id in HEDGED_TOOLS and not stream and not probe:
+            response = _hedged_post(url, payload, tool_id, timeout)
+        else:
+            response = gemini_client.post(url, payload, stream=stream, timeout=timeout)
+    except requests.exceptions.RequestException:
+        _breaker.record(False, time.monotonic() - start, probe, timeout)
+        raise
+
+    latency = time.monotonic() - start
+    ok = None if response.status_code == 429 else not is_failure(response.status_code)
+    _breaker.record(ok, latency, probe, timeout)
+    if ok and tool_id in HEDGED_TOOLS:
+        _hedger.observe(tool_id, latency)
+    return response
+
+
+def stats() -> dict:
+    return {
+        "circuit": _breaker.snapshot(),
+        "hedging": _hedger.snapshot(),
+        "deadlines": {**DEADLINES, **TOOL_DEADLINES},
+        "long_output_tokens": LONG_OUTPUT_TOKENS,
+    }
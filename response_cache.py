@@ -0,0 +1,205 @@
+"""Result cache for deterministic /api/generate prompts.
+
+Popular tool inputs (keywords, titles, FAQs, ...) are answered from cache
+instead of paying for a fresh Gemini call. Entries are keyed on a hash of
+the tool id, the normalized input, the target and the template version.
+
+Two layers are consulted in order:
+
+* an in-process LRU with a TTL, bounded by entry count and total bytes
+* an optional SQLite file (RESPONSE_CACHE_DB) shared by every gunicorn worker
+
+Templates opt out with ``"cache": false`` in prompt_templates.json.
+Answers from templates with Google Search grounding reflect what the web
+said at the time, so they live in a separate, smaller cache with a shorter
+TTL (RESPONSE_CACHE_GROUNDED_TTL) and never mix with ungrounded entries.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_db import Database
+
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+DB_PATH = os.getenv("RESPONSE_CACHE_DB")
+GROUNDED_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_GROUNDED_MAX_ENTRIES", "500"))
+GROUNDED_TTL = float(os.getenv("RESPONSE_CACHE_GROUNDED_TTL", "3600"))
+GROUNDED_PREFIX = "grounded:"
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry and a total size budget."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, size, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, size: int = 1, ttl: float = None):
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._remove(key)
+                return entry[0]
+            return None
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+
+class SQLiteCache:
+    """Key/value store in a SQLite file, safe to share between processes."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, ttl: float, table: str = "response_cache"):
+        self.ttl = ttl
+        self.table = table
+        self.db = Database(
+            path,
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)",
+        )
+        self._writes = 0
+
+    def get(self, key: str):
+        rows = self.db.execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND expires > ?",
+            (key, time.time()),
+        )
+        return rows[0][0] if rows else None
+
+    def set(self, key: str, value: str, ttl: float = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self.db.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, expires),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.db.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (time.time(),))
+
+    def delete(self, key: str):
+        self.db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+
+class ResponseCache:
+    def __init__(self, memory: LRUCache, disk: SQLiteCache = None):
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value, len(value.encode("utf-8")))
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        self.memory.set(key, value, len(value.encode("utf-8")))
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "shared": self.disk is not None,
+        }
+
+
+_cache = ResponseCache(
+    LRUCache(MAX_ENTRIES, MAX_BYTES, TTL),
+    SQLiteCache(DB_PATH, TTL) if DB_PATH else None,
+)
+_grounded_cache = ResponseCache(
+    LRUCache(GROUNDED_MAX_ENTRIES, MAX_BYTES // 4, GROUNDED_TTL),
+    SQLiteCache(DB_PATH, GROUNDED_TTL, table="grounded_response_cache") if DB_PATH else None,
+)
+
+
+def normalize_input(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def make_key(tool_id: str, user_input: str, target: str, version: str) -> str:
+    raw = "\0".join((tool_id, normalize_input(user_input), str(target), version))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def template_key(tool_id: str, tpl, user_input: str, target: str):
+    """Cache key for a prompts.Template request, or None if it opted out."""
+    if not tpl.cache:
+        return None
+    # Only templates that use {target} should split the cache on it.
+    if not tpl.uses_target:
+        target = ""
+    key = make_key(tool_id, user_input, target, tpl.version)
+    return GROUNDED_PREFIX + key if tpl.grounding else key
+
+
+def _cache_for(key: str) -> ResponseCache:
+    return _grounded_cache if key.startswith(GROUNDED_PREFIX) else _cache
+
+
+def get(key: str):
+    return _cache_for(key).get(key)
+
+
+def put(key: str, value: str):
+    _cache_for(key).set(key, value)
+
+
+def stats() -> dict:
+    return {**_cache.stats(), "grounded": _grounded_cache.stats()}
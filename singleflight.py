@@ -0,0 +1,75 @@
+"""In-flight request coalescing for identical Gemini prompts.
+
+When many users run the same tool on the same topic at once, only the first
+request goes upstream; the others wait for it and share its result. Works
+with sync, threaded and gevent workers (threading is monkey-patched there).
+"""
+import hashlib
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn):
+        """Run ``fn`` once per ``key`` among concurrent callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+_group = SingleFlight()
+
+
+def prompt_key(prompt: str, system_message: str) -> str:
+    return hashlib.sha256(f"{system_message}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def do(key: str, fn):
+    return _group.do(key, fn)
+
+
+def stats() -> dict:
+    return _group.stats()
@@ -0,0 +1,506 @@
+"""Build step for the static pages.
+
+Every article repeats the same ~15 KB ``<style>`` block, and sitemap.xml used
+to be edited by hand. This script turns the source pages into the files that
+are actually served:
+
+    python site_build.py                 # incremental
+    python site_build.py --force         # rebuild every page
+
+* Shared CSS: the inline stylesheet is split into rules, and the rules found
+  on at least SITE_SHARED_CSS_THRESHOLD of the pages go into one
+  ``css/site.<hash>.css``, which can be cached as immutable. Pages that carry
+  all of those rules link it in place of their copy and keep only their own
+  rules inline; pages that do not are left with their full stylesheet.
+* HTML is minified conservatively: comments and runs of whitespace are
+  collapsed, CSS is stripped of comments and spacing, JSON-LD is compacted.
+  ``<pre>``, ``<textarea>`` and ``<script>`` code are left as written.
+* Every ``<img>`` after the first (usually the hero) gets
+  ``loading="lazy"`` and ``decoding="async"``, and images without a size get
+  ``width``/``height`` from images/optimized/manifest.json or the file header,
+  so the layout does not shift as they load. Images that image_pipeline.py
+  has optimized also get a ``srcset`` of ``?w=`` widths with
+  ``sizes`` (SITE_IMAGE_SIZES), so phones fetch a narrow variant;
+  static_assets.py picks the WebP/AVIF file for each width.
+* sitemap.xml is regenerated from every page with a self-referencing
+  canonical link that is not ``noindex``, and categories/search-index.json
+  holds the articles listed on the category pages, for client-side search.
+
+Pages go to SITE_BUILD_DIR (``.site-build/``), which static_assets.py serves
+in place of the sources. ``.site-build/.manifest.json`` records the source
+hash of every built page, so a rerun only rebuilds pages that changed, or all
+of them when the shared stylesheet or the image manifest changes.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import struct
+from urllib.parse import unquote, urlsplit
+
+import image_pipeline
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = os.getenv("SITE_BUILD_DIR", os.path.join(ROOT, ".site-build"))
+MANIFEST = os.path.join(BUILD_DIR, ".manifest.json")
+SHARED_THRESHOLD = float(os.getenv("SITE_SHARED_CSS_THRESHOLD", "0.5"))
+IMAGE_SIZES = os.getenv("SITE_IMAGE_SIZES", "100vw")
+SITE_URL = "https://quickgenai.in"
+PAGE_DIRS = ("", "categories")
+SITEMAP = os.path.join(ROOT, "sitemap.xml")
+SEARCH_INDEX = os.path.join(ROOT, "categories", "search-index.json")
+
+# Bump when the transforms change, so every page is rebuilt once.
+BUILD_VERSION = 2
+
+_STYLE = re.compile(r"<style\b[^>]*>(.*?)</style\s*>", re.S | re.I)
+_RAW = re.compile(r"(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACING = re.compile(r"\s*([{};,>])\s*")
+_IMG = re.compile(r"<img\b[^>]*>", re.I)
+_ATTR = re.compile(r"([\w:-]+)(?:\s*=\s*(\"[^\"]*\"|'[^']*'|[^\s>]+))?")
+_CANONICAL = re.compile(r"<link\b[^>]*rel=[\"']canonical[\"'][^>]*>", re.I)
+_ROBOTS = re.compile(r"<meta\b[^>]*name=[\"']robots[\"'][^>]*>", re.I)
+_HREF = re.compile(r"href=[\"']([^\"']*)[\"']", re.I)
+_TAG = re.compile(r"<[^>]+>")
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _write_if_changed(path: str, data: bytes) -> bool:
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    _write_atomic(path, data)
+    return True
+
+
+def _sources() -> dict:
+    """Map each page (path relative to ROOT) to its source bytes."""
+    pages = {}
+    for directory in PAGE_DIRS:
+        for name in sorted(os.listdir(os.path.join(ROOT, directory))):
+            if name.endswith(".html"):
+                rel = f"{directory}/{name}" if directory else name
+                with open(os.path.join(ROOT, rel), "rb") as f:
+                    pages[rel] = f.read()
+    return pages
+
+
+# --- CSS ---------------------------------------------------------------------
+
+def minify_css(css: str) -> str:
+    css = _CSS_COMMENT.sub("", css)
+    css = _CSS_SPACING.sub(r"\1", " ".join(css.split()))
+    return css.replace(";}", "}").strip()
+
+
+def css_rules(css: str) -> list:
+    """Split a stylesheet into minified top-level rules.
+
+    ``@media`` and ``@keyframes`` blocks stay whole, as do statements such as
+    ``@import`` that end in a semicolon.
+    """
+    css = _CSS_COMMENT.sub("", css)
+    rules = []
+    depth = start = 0
+    for i, char in enumerate(css):
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                rules.append(css[start:i + 1])
+                start = i + 1
+        elif char == ";" and depth == 0:
+            rules.append(css[start:i + 1])
+            start = i + 1
+    rules.append(css[start:])
+    return [rule for rule in map(minify_css, rules) if rule]
+
+
+def shared_rules(pages: dict, threshold: float = SHARED_THRESHOLD) -> list:
+    """Rules on at least ``threshold`` of the styled pages, in page order."""
+    styled = {}
+    for rel, text in pages.items():
+        blocks = _STYLE.findall(text)
+        if blocks:
+            styled[rel] = [rule for block in blocks for rule in css_rules(block)]
+
+    counts = {}
+    for rules in styled.values():
+        for rule in set(rules):
+            counts[rule] = counts.get(rule, 0) + 1
+    common = {rule for rule, count in counts.items() if count >= threshold * len(styled)}
+
+    # Take the order from the first page that has all of them.
+    for rules in styled.values():
+        if common <= set(rules):
+            return list(dict.fromkeys(rule for rule in rules if rule in common))
+    return []
+
+
+def _split_style(css: str, shared: list):
+    """Return the rules a page keeps inline, or None if it cannot use ``shared``."""
+    rules = css_rules(css)
+    wanted = set(shared)
+    if not wanted <= set(rules):
+        return None
+    if list(dict.fromkeys(rule for rule in rules if rule in wanted)) != shared:
+        return None
+
+    inline = []
+    for rule in rules:
+        # A shared rule that came after one of the page's own rules must
+        # still come after it, so it is repeated inline.
+        if rule not in wanted or inline:
+            inline.append(rule)
+    return inline
+
+
+def extract_shared_css(text: str, shared: list, href: str) -> str:
+    blocks = list(_STYLE.finditer(text))
+    if not shared or len(blocks) != 1:
+        return text
+    block = blocks[0]
+    inline = _split_style(block.group(1), shared)
+    if inline is None:
+        return text
+    replacement = f'<link rel="stylesheet" href="{href}">'
+    if inline:
+        replacement += f"<style>{''.join(inline)}</style>"
+    return text[:block.start()] + replacement + text[block.end():]
+
+
+# --- Images ------------------------------------------------------------------
+
+def _image_size(path: str):
+    """(width, height) read from a PNG, GIF or JPEG header, or None."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if not head.startswith(b"\xff\xd8"):
+                return None
+            f.seek(2)
+            while True:
+                marker = f.read(4)
+                if len(marker) < 4 or marker[0] != 0xFF:
+                    return None
+                length = struct.unpack(">H", marker[2:])[0]
+                if marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                    height, width = struct.unpack(">xHH", f.read(5))
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+
+class ImageSizes:
+    """Intrinsic sizes and optimized variant widths of the site's images."""
+
+    def __init__(self):
+        self._manifest = image_pipeline.load_manifest()
+        self._known = {rel: (entry["width"], entry["height"]) for rel, entry in self._manifest.items()}
+
+    def digest(self) -> str:
+        """Changes whenever a size or the set of variant widths changes."""
+        widths = {rel: [self._known[rel], self.variant_widths(rel)] for rel in sorted(self._manifest)}
+        return _hash(json.dumps(widths).encode("utf-8"))[:20]
+
+    @staticmethod
+    def resolve(page: str, src: str):
+        """Path of a local image relative to ROOT, or None."""
+        parts = urlsplit(src)
+        if parts.scheme or parts.netloc:
+            if f"{parts.scheme}://{parts.netloc}" != SITE_URL:
+                return None
+        path = unquote(parts.path)
+        if path.startswith("/"):
+            rel = path.lstrip("/")
+        else:
+            rel = os.path.normpath(os.path.join(os.path.dirname(page), path)).replace(os.sep, "/")
+        return None if rel.startswith("..") else rel
+
+    def lookup(self, rel: str):
+        if rel not in self._known:
+            full = os.path.join(ROOT, rel)
+            if not os.path.isfile(full):
+                return None
+            self._known[rel] = _image_size(full)
+        return self._known[rel]
+
+    def variant_widths(self, rel: str) -> list:
+        """Widths of the image's optimized variants."""
+        entry = self._manifest.get(rel)
+        return sorted({v["width"] for v in entry["variants"]}) if entry else []
+
+
+def _srcset(src: str, size: tuple, widths: list) -> str:
+    # Candidates are split on whitespace, so spaces in file names must be escaped.
+    src = src.replace(" ", "%20")
+    # static_assets.py answers a width past every variant with the source.
+    widths = sorted(set(widths) | {size[0]})
+    return ", ".join(f"{src}?w={width} {width}w" for width in widths)
+
+
+def _img_attributes(tag: str) -> dict:
+    body = tag[4:].rstrip(">").rstrip("/")
+    return {name.lower(): value for name, value in _ATTR.findall(body)}
+
+
+def optimize_images(text: str, page: str, sizes: ImageSizes) -> str:
+    seen = 0
+
+    def rewrite(match):
+        nonlocal seen
+        tag = match.group(0)
+        attrs = _img_attributes(tag)
+        seen += 1
+        added = []
+        if seen > 1:
+            if "loading" not in attrs:
+                added.append('loading="lazy"')
+            if "decoding" not in attrs:
+                added.append('decoding="async"')
+        src = attrs.get("src", "").strip("\"'")
+        rel = sizes.resolve(page, html.unescape(src)) if src and "${" not in src else None
+        size = sizes.lookup(rel) if rel else None
+        if size and "width" not in attrs and "height" not in attrs:
+            added.append(f'width="{size[0]}" height="{size[1]}"')
+        widths = sizes.variant_widths(rel) if size and "?" not in src else []
+        if widths and "srcset" not in attrs:
+            added.append(f'srcset="{_srcset(src, size, widths)}"')
+            if "sizes" not in attrs:
+                added.append(f'sizes="{IMAGE_SIZES}"')
+        if not added:
+            return tag
+        end = len(tag) - (2 if tag.endswith("/>") else 1)
+        return f"{tag[:end].rstrip()} {' '.join(added)}{tag[end:]}"
+
+    return _outside_raw(text, lambda segment: _IMG.sub(rewrite, segment))
+
+
+# --- HTML --------------------------------------------------------------------
+
+def _outside_raw(text: str, transform, raw=None) -> str:
+    """Apply ``transform`` to the markup outside pre/textarea/script/style."""
+    out = []
+    position = 0
+    for match in _RAW.finditer(text):
+        out.append(transform(text[position:match.start()]))
+        out.append(raw(match) if raw else match.group(0))
+        position = match.end()
+    out.append(transform(text[position:]))
+    return "".join(out)
+
+
+def _collapse(segment: str) -> str:
+    segment = _COMMENT.sub("", segment)
+    return re.sub(r"\s+", lambda m: "\n" if "\n" in m.group(0) else " ", segment)
+
+
+def _minify_raw(match) -> str:
+    opening, name, body, closing = match.groups()
+    name = name.lower()
+    if name == "style":
+        body = minify_css(body)
+    elif name == "script" and "ld+json" in opening.lower():
+        try:
+            body = json.dumps(json.loads(body), ensure_ascii=False, separators=(",", ":"))
+        except ValueError:
+            pass
+    return opening + body + closing
+
+
+def minify_html(text: str) -> str:
+    return _outside_raw(text, _collapse, _minify_raw).strip() + "\n"
+
+
+def build_page(rel: str, text: str, shared: list, href: str, sizes: ImageSizes) -> str:
+    text = extract_shared_css(text, shared, href)
+    text = optimize_images(text, rel, sizes)
+    return minify_html(text)
+
+
+# --- Sitemap and search index ------------------------------------------------
+
+def page_url(rel: str) -> str:
+    slug = rel[:-len(".html")]
+    return f"{SITE_URL}/" if slug == "index" else f"{SITE_URL}/{slug}"
+
+
+def indexable(rel: str, text: str) -> bool:
+    """A page belongs in the sitemap if it is canonical and not noindex."""
+    robots = _ROBOTS.search(text)
+    if robots and "noindex" in robots.group(0).lower():
+        return False
+    canonical = _CANONICAL.search(text)
+    href = _HREF.search(canonical.group(0)) if canonical else None
+    return bool(href) and html.unescape(href.group(1)).rstrip("/") == page_url(rel).rstrip("/")
+
+
+def build_sitemap(pages: dict) -> bytes:
+    urls = [page_url(rel) for rel, text in pages.items() if indexable(rel, text)]
+    # Home page first, then the category pages, then everything else.
+    urls.sort(key=lambda url: (url != f"{SITE_URL}/", "/categories/" not in url, url))
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    lines.extend(f"  <url><loc>{html.escape(url, quote=False)}</loc></url>" for url in urls)
+    lines.append("</urlset>")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _text(fragment: str) -> str:
+    return " ".join(html.unescape(_TAG.sub(" ", fragment)).split())
+
+
+def _find(pattern: str, fragment: str) -> str:
+    match = re.search(pattern, fragment, re.S | re.I)
+    return _text(match.group(1)) if match else ""
+
+
+def _slug(url: str) -> str:
+    path = urlsplit(url).path if url.startswith(SITE_URL) else url
+    return path.strip("/")
+
+
+def build_search_index(pages: dict) -> bytes:
+    """Articles listed on the category pages, as compact rows.
+
+    ``{"fields": [...], "categories": [...], "items": [[url, title,
+    description, category index, tag], ...]}``; each article appears once,
+    under the first category that lists it.
+    """
+    categories = []
+    items = {}
+    for rel, text in pages.items():
+        if not rel.startswith("categories/"):
+            continue
+        category = len(categories)
+        categories.append({"name": _find(r"<h1[^>]*>(.*?)</h1>", text), "url": _slug(page_url(rel))})
+
+        cards = []
+        hero = re.search(r'<div class="hero-content">(.*?)</section>', text, re.S)
+        if hero:
+            cards.append((hero.group(1), r"<h2[^>]*>(.*?)</h2>", ""))
+        for card in re.findall(r'<article class="blog-card">(.*?)</article>', text, re.S):
+            cards.append((card, r"<h3[^>]*>(.*?)</h3>", _find(r'class="blog-card-category">(.*?)</div>', card)))
+
+        for fragment, title_pattern, tag in cards:
+            link = re.search(r'<a href="([^"]+)"[^>]*class="(?:read-more|btn-primary)"', fragment)
+            if not link:
+                continue
+            url = _slug(html.unescape(link.group(1)))
+            if url and url not in items:
+                items[url] = [url, _find(title_pattern, fragment), _find(r"<p[^>]*>(.*?)</p>", fragment), category, tag]
+
+    index = {
+        "fields": ["url", "title", "description", "category", "tag"],
+        "categories": categories,
+        "items": list(items.values()),
+    }
+    return (json.dumps(index, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# --- Build -------------------------------------------------------------------
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def build(force: bool = False, threshold: float = SHARED_THRESHOLD) -> dict:
+    sources = _sources()
+    texts = {rel: data.decode("utf-8") for rel, data in sources.items()}
+
+    shared = shared_rules(texts, threshold)
+    css = "".join(shared).encode("utf-8")
+    css_name = f"css/site.{_hash(css)[:12]}.css" if shared else None
+    if css_name:
+        _write_if_changed(os.path.join(BUILD_DIR, css_name), css)
+
+    sizes = ImageSizes()
+    inputs = {"version": BUILD_VERSION, "css": css_name, "images": sizes.digest()}
+    manifest = load_manifest()
+    if force or any(manifest.get(key) != value for key, value in inputs.items()):
+        manifest = {**inputs, "pages": {}}
+    built = manifest["pages"]
+
+    for rel in set(built) - set(sources):
+        _remove(os.path.join(BUILD_DIR, rel))
+        del built[rel]
+    css_dir = os.path.join(BUILD_DIR, "css")
+    if os.path.isdir(css_dir):
+        for name in os.listdir(css_dir):
+            if f"css/{name}" != css_name:
+                _remove(os.path.join(css_dir, name))
+
+    rebuilt = before = after = 0
+    for rel, data in sources.items():
+        digest = _hash(data)
+        out = os.path.join(BUILD_DIR, rel)
+        if built.get(rel) == digest and os.path.exists(out):
+            continue
+        page = build_page(rel, texts[rel], shared, f"/{css_name}", sizes).encode("utf-8")
+        _write_atomic(out, page)
+        built[rel] = digest
+        rebuilt += 1
+        before += len(data)
+        after += len(page)
+
+    _write_atomic(MANIFEST, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    sitemap = _write_if_changed(SITEMAP, build_sitemap(texts))
+    search = _write_if_changed(SEARCH_INDEX, build_search_index(texts))
+
+    print(f"{len(sources)} pages, {rebuilt} rebuilt, {len(sources) - rebuilt} unchanged")
+    if rebuilt:
+        print(f"  {before // 1024} KB -> {after // 1024} KB")
+    if css_name:
+        print(f"  {css_name}: {len(shared)} shared rules, {len(css) // 1024} KB")
+    print(f"  sitemap.xml {'updated' if sitemap else 'unchanged'}, "
+          f"search index {'updated' if search else 'unchanged'}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--force", action="store_true", help="rebuild every page")
+    parser.add_argument(
+        "--threshold", type=float, default=SHARED_THRESHOLD,
+        help="share of pages a CSS rule must appear on to go into the shared file",
+    )
+    args = parser.parse_args()
+    build(args.force, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
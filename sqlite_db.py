@@ -0,0 +1,99 @@
+"""One SQLite connection per process for state shared between gunicorn workers.
+
+admission.py, jobs.py, response_cache.py and chat_sessions.py keep their
+shared state in SQLite files. ``Database`` opens each file once per process
+(again after a fork), applies the pragmas and schema once, and serializes
+every thread or greenlet on that connection behind a lock. A per-thread
+connection would be opened, and the schema re-run, for every greenlet of a
+gevent worker.
+
+The connection never waits inside SQLite's busy handler, which would block
+a gevent hub: when another process holds the write lock, ``execute`` and
+``transaction`` retry with short ``time.sleep`` backoffs, which yield under
+gevent, for up to SQLITE_BUSY_TIMEOUT seconds.
+
+Files run in WAL mode with ``synchronous=NORMAL``: commits skip the fsync,
+and a power loss can drop only the last few rate-limit buckets, leases,
+jobs or cache entries, never corrupt the file.
+"""
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+
+
+def _busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+class Database:
+    def __init__(self, path: str, *schema: str, pragmas: tuple = ("journal_mode=WAL", "synchronous=NORMAL")):
+        self.path = path
+        self.schema = schema
+        self.pragmas = pragmas
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.opened = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+        for pragma in self.pragmas:
+            self._retry(conn.execute, f"PRAGMA {pragma}")
+        for statement in self.schema:
+            self._retry(conn.execute, statement)
+        self.opened += 1
+        return conn
+
+    @staticmethod
+    def _retry(call, *args):
+        deadline = time.monotonic() + BUSY_TIMEOUT
+        delay = 0.0005
+        while True:
+            try:
+                return call(*args)
+            except sqlite3.OperationalError as e:
+                if not _busy(e) or time.monotonic() + delay > deadline:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """The process's connection, held exclusively for the ``with`` block."""
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                self._conn = self._open()
+                self._pid = os.getpid()
+            yield self._conn
+
+    def execute(self, sql: str, params=()) -> list:
+        """Run one statement in autocommit mode and return its rows."""
+        with self.connection() as conn:
+            return self._retry(lambda: conn.execute(sql, params).fetchall())
+
+    def update(self, sql: str, params=()) -> int:
+        """Run one write statement and return how many rows it changed."""
+        with self.connection() as conn:
+            return self._retry(lambda: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql: str, rows):
+        rows = list(rows)
+        with self.connection() as conn:
+            self._retry(conn.executemany, sql, rows)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """``BEGIN IMMEDIATE`` ... ``COMMIT``, rolled back if the block raises."""
+        with self.connection() as conn:
+            self._retry(conn.execute, "BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
@@ -0,0 +1,316 @@
+"""Precompressed, cache-friendly serving of the site's static files.
+
+At startup the site tree is indexed once: size, content-hash ETag, MIME type
+and cache policy of every servable file, plus gzip/brotli variants of the
+text assets (HTML, CSS, JS, XML, SVG, ...). Variants are written ahead of
+time into STATIC_CACHE_DIR, named by content hash, so they are built once
+per file version and shared by every worker. The gunicorn master builds them
+in ``on_starting`` (or run ``python static_assets.py`` at deploy time);
+workers only pick up the variants that exist, so they do not all compress
+the site in parallel at boot. Set STATIC_PRECOMPRESS_ON_START=1 to have a
+single-process server such as ``python app.py`` build them itself.
+
+Requests are then answered from the in-memory index without a ``stat``:
+
+* the variant is chosen from Accept-Encoding (br, then gzip, then identity)
+* strong ETags per variant give 304s on revalidation
+* ``images/`` is served ``immutable`` for a year, HTML is revalidated
+* the body goes out through ``wsgi.file_wrapper``, which gunicorn turns into
+  a zero-copy ``sendfile``
+
+Only indexed files are served, so application code, dotfiles and the cache
+directory itself are never exposed. ``/about`` falls back to ``about.html``,
+like the .htaccess rewrite on the static host.
+
+When image_pipeline.py has run, a request for a source image under images/
+is answered with the smallest suitable WebP/AVIF variant from its manifest,
+chosen by the Accept header and the requested width (``?w=``, or the
+``Sec-CH-Width``/``Width`` client hints). site_build.py writes the ``?w=``
+widths into each image's ``srcset``, so browsers ask for the width they
+will display; a width beyond every variant gets the source image.
+
+When site_build.py has run, the pages it built in SITE_BUILD_DIR (minified,
+linking the shared ``css/site.<hash>.css``) are served in place of the
+source pages, and the fingerprinted stylesheet is cached as immutable.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import sys
+import threading
+import time
+
+from flask import abort, request
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("STATIC_CACHE_DIR", os.path.join(ROOT, ".static-cache"))
+SITE_BUILD_DIR = os.getenv("SITE_BUILD_DIR", os.path.join(ROOT, ".site-build"))
+PRECOMPRESS_ON_START = os.getenv("STATIC_PRECOMPRESS_ON_START", "0") == "1"
+RESCAN_INTERVAL = float(os.getenv("STATIC_RESCAN_INTERVAL", "0"))
+
+SERVED_EXTENSIONS = {
+    ".html", ".css", ".js", ".json", ".xml", ".txt", ".svg", ".ico",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif",
+}
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".json", ".xml", ".txt", ".svg"}
+EXCLUDED_DIRS = {".git", "__pycache__", ".static-cache", ".venv", "venv", "node_modules"}
+EXCLUDED_FILES = {"requests.jsonl", "requirements.txt", "prompt_templates.json"}
+
+IMAGE_MANIFEST = os.path.join(ROOT, "images", "optimized", "manifest.json")
+IMAGE_FORMATS = ("avif", "webp")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+DEFAULT = "public, max-age=86400"
+
+
+class Asset:
+    __slots__ = ("path", "size", "etag", "mimetype", "cache_control", "variants")
+
+    def __init__(self, path, size, digest, mimetype, cache_control):
+        self.path = path
+        self.size = size
+        self.etag = digest
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.variants = {}
+
+
+def _cache_control(rel: str, ext: str) -> str:
+    if rel.startswith(("images/", "css/")):
+        return IMMUTABLE
+    if ext == ".html":
+        return REVALIDATE
+    return DEFAULT
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _build_variants(asset: Asset, precompress: bool):
+    """Attach (path, size) of each compressed variant that exists or is built."""
+    encoders = {"gzip": (".gz", lambda data: gzip.compress(data, 9, mtime=0))}
+    if brotli is not None:
+        encoders["br"] = (".br", lambda data: brotli.compress(data, quality=11))
+
+    data = None
+    for encoding, (suffix, compress) in encoders.items():
+        path = os.path.join(CACHE_DIR, asset.etag + suffix)
+        if not os.path.exists(path):
+            if not precompress:
+                continue
+            if data is None:
+                with open(asset.path, "rb") as f:
+                    data = f.read()
+            compressed = compress(data)
+            # Not worth serving a variant that barely saves anything.
+            if len(compressed) > 0.9 * len(data):
+                continue
+            _write_atomic(path, compressed)
+        asset.variants[encoding] = (path, os.path.getsize(path))
+
+
+def build_index(
+    root: str = ROOT, precompress: bool = PRECOMPRESS_ON_START, manifest: str = "hashes.json"
+) -> dict:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manifest_path = os.path.join(CACHE_DIR, manifest)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            known = json.load(f)
+    except (OSError, ValueError):
+        known = {}
+
+    index = {}
+    hashes = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS and not d.startswith(".")]
+        for name in filenames:
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in SERVED_EXTENSIONS or name in EXCLUDED_FILES or name.startswith("."):
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            st = os.stat(path)
+            # Rehash only files whose size or mtime changed since the last build.
+            entry = known.get(rel)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                digest = entry[2]
+            else:
+                digest = _hash_file(path)
+            hashes[rel] = [st.st_size, st.st_mtime_ns, digest]
+
+            mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            asset = Asset(path, st.st_size, digest, mimetype, _cache_control(rel, ext))
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                _build_variants(asset, precompress)
+            index[rel] = asset
+
+    if hashes != known:
+        _write_atomic(manifest_path, json.dumps(hashes).encode("utf-8"))
+    return index
+
+
+def index_site(root: str = ROOT, precompress: bool = PRECOMPRESS_ON_START) -> dict:
+    """Index ``root``, with the pages site_build.py built served in their place."""
+    index = build_index(root, precompress)
+    if os.path.isdir(SITE_BUILD_DIR):
+        index.update(build_index(SITE_BUILD_DIR, precompress, manifest="site-build-hashes.json"))
+    return index
+
+
+def _accepted_encodings() -> set:
+    accepted = set()
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticFiles:
+    def __init__(self, root: str = ROOT):
+        self.root = root
+        self.index = {}
+        self.images = {}
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        started = time.monotonic()
+        self.index = index_site(self.root)
+        self.images = _load_image_manifest()
+        self._scanned = time.monotonic()
+        logging.info(
+            "Indexed %d static files in %.2fs (brotli %s)",
+            len(self.index), self._scanned - started, "on" if brotli else "off",
+        )
+
+    def _lookup(self, filename: str):
+        if RESCAN_INTERVAL and time.monotonic() - self._scanned > RESCAN_INTERVAL:
+            with self._lock:
+                if time.monotonic() - self._scanned > RESCAN_INTERVAL:
+                    self.refresh()
+        filename = filename.strip("/")
+        if filename not in self.index and filename + ".html" in self.index:
+            filename += ".html"
+        return filename, self.index.get(filename)
+
+    def _image_variant(self, rel: str):
+        """Pick the best optimized variant of a source image for this request."""
+        entry = self.images.get(rel)
+        if entry is None:
+            return None
+        accept = request.headers.get("Accept", "")
+        wanted = (
+            request.args.get("w", type=int)
+            or request.headers.get("Sec-CH-Width", type=int)
+            or request.headers.get("Width", type=int)
+        )
+        for fmt in IMAGE_FORMATS:
+            if f"image/{fmt}" not in accept:
+                continue
+            variants = sorted(
+                (v for v in entry["variants"] if v["format"] == fmt), key=lambda v: v["width"]
+            )
+            if not variants:
+                continue
+            fitting = [v for v in variants if wanted and v["width"] >= wanted]
+            if wanted and not fitting and entry["width"] > variants[-1]["width"]:
+                return None
+            variant = fitting[0] if fitting else variants[-1]
+            if variant["bytes"] < entry["bytes"]:
+                return self.index.get(variant["file"])
+        return None
+
+    def send(self, filename: str) -> Response:
+        rel, asset = self._lookup(filename)
+        if asset is None:
+            abort(404)
+
+        vary = []
+        if rel in self.images:
+            vary.extend(("Accept", "Sec-CH-Width", "Width"))
+            asset = self._image_variant(rel) or asset
+
+        path, size, encoding = asset.path, asset.size, None
+        accepted = _accepted_encodings()
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and candidate in accepted:
+                path, size = asset.variants[candidate]
+                encoding = candidate
+                break
+
+        etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+        headers = {"Cache-Control": asset.cache_control}
+        if asset.variants:
+            vary.append("Accept-Encoding")
+        if vary:
+            headers["Vary"] = ", ".join(vary)
+
+        if etag in request.if_none_match:
+            response = Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        f = open(path, "rb")
+        response = Response(
+            wrap_file(request.environ, f),
+            mimetype=asset.mimetype,
+            headers=headers,
+            direct_passthrough=True,
+        )
+        response.content_length = size
+        if encoding:
+            response.content_encoding = encoding
+        response.set_etag(etag)
+        return response
+
+
+def _load_image_manifest() -> dict:
+    try:
+        with open(IMAGE_MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app) -> StaticFiles:
+    """Serve every indexed file at ``/<path>`` on ``app``."""
+    files = StaticFiles()
+    app.add_url_rule("/<path:filename>", "static_asset", files.send, methods=["GET"])
+    return files
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1:
+        built = build_index(sys.argv[1], precompress=True)
+    else:
+        built = index_site(precompress=True)
+    variants = sum(len(asset.variants) for asset in built.values())
+    print(f"{len(built)} files indexed, {variants} compressed variants in {CACHE_DIR}")
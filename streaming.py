@@ -0,0 +1,113 @@
+"""Server-Sent Events streaming for Gemini completions.
+
+The ``/stream`` variants of ``/api/generate`` and ``/api/chat`` forward text to
+the browser as soon as Gemini's ``streamGenerateContent`` produces it:
+
+    data: {"text": "..."}            one event per upstream chunk
+    event: done
+    data: {...}                       same JSON body as the blocking endpoint
+    event: error
+    data: {"success": false, "error": "..."}
+
+Clients that only care about the final result can read the ``done`` event
+and keep using the existing JSON contract unchanged.
+"""
+import json
+import logging
+
+import requests
+from flask import Response, stream_with_context
+
+import gemini_client
+import log_config
+import metrics
+import resilience
+
+
+class GeminiStreamError(Exception):
+    pass
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    body = f"data: {json.dumps(data)}\n\n"
+    if event:
+        return f"event: {event}\n{body}"
+    return body
+
+
+def stream_gemini(url: str, payload: dict, tool_id: str = None):
+    """Yield completion text chunks from Gemini as they arrive."""
+    with metrics.upstream(tool_id, payload) as call:
+        response = resilience.post(gemini_client.stream_url(url), payload, tool_id, stream=True)
+        try:
+            if response.status_code != 200:
+                call.finish(response.status_code)
+                try:
+                    message = response.json().get("error", {}).get("message")
+                except ValueError:
+                    message = None
+                raise GeminiStreamError(message or f"HTTP {response.status_code}")
+
+            usage = None
+            size = 0
+            for chunk in gemini_client.iter_sse(response):
+                if "error" in chunk:
+                    raise GeminiStreamError(chunk["error"].get("message", "Unknown error"))
+                usage = chunk.get("usageMetadata") or usage
+                text = gemini_client.candidate_text(chunk)
+                if text:
+                    size += len(text)
+                    yield text
+            call.finish(200, usage, size)
+        finally:
+            response.close()
+    log_config.log_upstream(tool_id, response.status_code, call.duration)
+
+
+def sse_response(chunks, build_result, on_result=None) -> Response:
+    """Stream ``chunks`` to the client as SSE.
+
+    ``build_result`` receives the full completion text and returns the body of
+    the final ``done`` event, so each app keeps its own response shape.
+    ``on_result`` is called with the text of a stream that completed cleanly.
+    """
+    def events():
+        texts = []
+        try:
+            for text in chunks:
+                texts.append(text)
+                yield sse_event({"text": text})
+        except GeminiStreamError as e:
+            yield sse_event({"success": False, "error": f"API Error: {e}"}, "error")
+            return
+        except resilience.CircuitOpenError:
+            yield sse_event({"success": False, "error": "AI service is busy right now. Please try again in a few seconds."}, "error")
+            return
+        except requests.exceptions.Timeout:
+            yield sse_event({"success": False, "error": "AI request timed out. Please try again."}, "error")
+            return
+        except Exception as e:
+            logging.exception("Gemini stream error")
+            message = f"AI service temporarily unavailable: {log_config.redact(str(e))}"
+            yield sse_event({"success": False, "error": message}, "error")
+            return
+
+        result = "".join(texts)
+        if result and on_result:
+            on_result(result)
+        result = result or "Sorry, I couldn't generate a response. Please try again."
+        yield sse_event(build_result(result), "done")
+
+    return event_stream(events())
+
+
+def event_stream(events) -> Response:
+    """Wrap an iterator of formatted SSE events in an unbuffered response."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -0,0 +1,55 @@
+"""Shared fixtures: both apps wired to a local fake_gemini.py server.
+
+The apps read their configuration at import time, so the fake server is
+started and the environment set up here, before any test imports them.
+"""
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_gemini  # noqa: E402
+
+SETTINGS = fake_gemini.Settings(latency=0.01, jitter=0.0, first_chunk=0.0, chunks=3, response_tokens=20)
+SERVER = fake_gemini.serve(settings=SETTINGS)
+STATE_DIR = tempfile.mkdtemp(prefix="qwickgen-tests-")
+
+os.environ.update({
+    "GOOGLE_API_KEY": "test-key",
+    "GEMINI_URL": fake_gemini.base_url(SERVER),
+    "RATE_LIMIT_ENABLED": "0",
+    "RATE_LIMIT_DB": os.path.join(STATE_DIR, "admission.db"),
+    "JOBS_DB": os.path.join(STATE_DIR, "jobs.db"),
+    "CHAT_SESSION_DB": os.path.join(STATE_DIR, "chat-sessions.db"),
+    "STATIC_CACHE_DIR": os.path.join(STATE_DIR, "static-cache"),
+    "STATIC_PRECOMPRESS_ON_START": "0",
+    "HEALTH_PROBE_INTERVAL": "3600",
+})
+
+
+@pytest.fixture(scope="session")
+def fake_server():
+    return SERVER
+
+
+@pytest.fixture
+def fake_settings(monkeypatch):
+    """The fake server's Settings; changes are undone after the test."""
+    for name, value in vars(SETTINGS).items():
+        monkeypatch.setattr(SETTINGS, name, value)
+    return SETTINGS
+
+
+@pytest.fixture(scope="session", params=["app", "app1"])
+def app_module(request):
+    return importlib.import_module(request.param)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,104 @@
+import threading
+
+import flask
+import pytest
+
+import admission
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        store = admission.MemoryStore()
+    else:
+        store = admission.SQLiteStore(str(tmp_path / "admission.db"))
+    monkeypatch.setattr(admission, "_store", store)
+    monkeypatch.setattr(admission, "ENABLED", True)
+    return store
+
+
+@pytest.fixture
+def api(store):
+    app = flask.Flask(__name__)
+
+    @app.post("/api/generate")
+    @app.post("/api/generate/batch")
+    @app.post("/api/chat")
+    def generate():
+        return {"success": True}
+
+    @app.post("/api/chat/stream")
+    def chat_stream():
+        def events():
+            yield "data: one\n\n"
+            yield "data: two\n\n"
+        return flask.Response(flask.stream_with_context(events()), mimetype="text/event-stream")
+
+    admission.init_app(app)
+    return app.test_client()
+
+
+def test_buckets_are_per_client_and_class(api, monkeypatch):
+    monkeypatch.setitem(admission.BUDGETS, "short", (2.0, 1 / 60))
+
+    for _ in range(2):
+        assert api.post("/api/generate", json={"tool": "hook"}).status_code == 200
+    response = api.post("/api/generate", json={"tool": "hook"})
+    assert response.status_code == 429
+    assert response.get_json()["success"] is False
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+    assert api.post("/api/chat", json={"tool": "chat_general"}).status_code == 200
+    assert api.post("/api/generate", json={"tool": "hook"}, headers={"X-API-Key": "other"}).status_code == 200
+    assert admission.stats()["rejected"]["rate_limited"] >= 1
+
+
+def test_in_flight_cap_and_lease_release(api, store, monkeypatch):
+    monkeypatch.setattr(admission, "MAX_IN_FLIGHT", 1)
+
+    assert api.post("/api/generate", json={"tool": "hook"}).status_code == 200
+    assert store.in_flight() == 0
+
+    # Hold a stream open on another thread, as a concurrent client would.
+    started, finish, chunks = threading.Event(), threading.Event(), []
+
+    def stream():
+        with api.post("/api/chat/stream", json={"tool": "chat_general"}, buffered=False) as response:
+            body = iter(response.response)
+            chunks.append(next(body))
+            started.set()
+            finish.wait(5)
+            chunks.extend(body)
+
+    reader = threading.Thread(target=stream)
+    reader.start()
+    assert started.wait(5)
+    assert store.in_flight() == 1
+
+    response = api.post("/api/generate", json={"tool": "hook"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert admission.stats()["rejected"]["over_capacity"] >= 1
+
+    finish.set()
+    reader.join(5)
+    assert chunks == [b"data: one\n\n", b"data: two\n\n"]
+    assert store.in_flight() == 0
+    assert api.post("/api/generate", json={"tool": "hook"}).status_code == 200
+
+
+def test_batch_larger_than_the_burst_is_rejected_up_front(api, monkeypatch):
+    monkeypatch.setitem(admission.BUDGETS, "long", (5.0, 5 / 60))
+
+    response = api.post("/api/generate/batch", json={"items": [{"tool": "blog"}] * 6})
+    assert response.status_code == 413
+    assert "limit is 5" in response.get_json()["error"]
+    assert "Retry-After" not in response.headers
+
+    assert api.post("/api/generate/batch", json={"items": [{"tool": "blog"}] * 5}).status_code == 200
+
+
+@pytest.mark.parametrize("body", ["[1]", "5", "null"])
+def test_non_object_bodies_are_charged_without_errors(api, body):
+    response = api.post("/api/generate/batch", data=body, content_type="application/json")
+    assert response.status_code == 200
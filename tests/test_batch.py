@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize("body", ["[1]", "5", "not json", '{"items": "hook"}', '{"items": []}'])
+def test_invalid_batch_bodies_return_json_errors(client, body):
+    response = client.post("/api/generate/batch", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_non_object_items_fail_alone(client):
+    response = client.post("/api/generate/batch", json={"items": [1, {"tool": "hook", "input": "tea"}]})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["success"] for result in results] == [False, True]
@@ -0,0 +1,51 @@
+import pytest
+
+import chat_context
+from chat_context import Conversation, build_conversation, estimate_tokens
+
+
+@pytest.fixture(autouse=True)
+def small_budget(monkeypatch):
+    monkeypatch.setattr(chat_context, "TOKEN_BUDGET", 200)
+    monkeypatch.setattr(chat_context, "MAX_TURN_TOKENS", 40)
+    monkeypatch.setattr(chat_context, "SUMMARY_TOKENS", 40)
+
+
+def _history(count, size=300):
+    return [{"user": f"question {i} " + "q" * size, "assistant": "a" * size} for i in range(count)]
+
+
+def test_short_history_is_kept_verbatim():
+    history = [{"user": "hi", "ai": "hello"}, {"user": "how are you", "assistant": "fine"}]
+    conversation = build_conversation("chat_test", history, "and you?")
+    assert conversation == "User: hi\nAssistant: hello\nUser: how are you\nAssistant: fine\nUser: and you?"
+
+
+def test_prompt_stays_within_the_budget_and_summarizes_dropped_turns():
+    conversation = build_conversation("chat_budget", _history(10), "latest")
+
+    assert estimate_tokens(conversation) <= chat_context.TOKEN_BUDGET
+    assert conversation.startswith("(Earlier in this conversation the user asked about: question 0")
+    assert conversation.endswith("User: latest")
+    assert "question 9" in conversation
+    assert " …" in conversation
+
+    stats = chat_context.stats()["chat_budget"]
+    assert stats["turns_dropped"] > 0
+    assert stats["turns_truncated"] > 0
+    assert stats["prompt_tokens_max"] <= chat_context.TOKEN_BUDGET
+
+
+def test_session_conversation_drops_oldest_turns_into_the_summary():
+    conversation = Conversation()
+    for turn in _history(6):
+        conversation.add(turn["user"], turn["assistant"])
+
+    prompt = conversation.render("chat_session", "latest")
+
+    assert estimate_tokens(prompt) <= chat_context.TOKEN_BUDGET
+    assert conversation.topics and conversation.topics[0].startswith("question 0")
+    assert prompt.startswith("(Earlier in this conversation the user asked about: question 0")
+    assert prompt.endswith("User: latest")
+    restored = Conversation.from_dict(conversation.to_dict())
+    assert restored.render("chat_session", "latest") == prompt
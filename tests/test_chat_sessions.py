@@ -0,0 +1,79 @@
+import chat_context
+import chat_sessions
+from response_cache import LRUCache
+
+
+def _chat(client, **body):
+    response = client.post("/api/chat", json={"tool": "chat_general", **body})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_session_continues_on_another_worker(client, monkeypatch):
+    first = _chat(client, message="plan a trip to Goa", session_id=None)
+    session_id = first["session_id"]
+
+    # A worker that never saw the session has nothing in memory.
+    monkeypatch.setattr(chat_sessions, "_memory", LRUCache(100, 1 << 20, 60))
+    second = _chat(client, message="and for a week?", session_id=session_id)
+
+    assert second["session_id"] == session_id
+    session = chat_sessions.open_session({"session_id": session_id})
+    assert [turn[0] for turn in session.conversation.turns] == ["plan a trip to Goa", "and for a week?"]
+
+
+def test_concurrent_turns_record_their_own_message():
+    session = chat_sessions.open_session({"session_id": None})
+    _, first = session.render("chat_general", "first question")
+    _, second = session.render("chat_general", "second question")
+
+    session.record(second, "second answer")
+    session.record(first, "first answer")
+
+    assert [turn[:2] for turn in session.conversation.turns] == [
+        ("second question", "second answer"),
+        ("first question", "first answer"),
+    ]
+
+
+def test_error_replies_are_not_kept():
+    session = chat_sessions.open_session({"session_id": None})
+    _, pending = session.render("chat_general", "hello")
+    session.record(pending, "AI service is busy right now. Please try again in a few seconds.")
+    assert session.conversation.turns == []
+
+
+def test_turns_from_two_workers_are_both_kept(monkeypatch):
+    first = chat_sessions.open_session({"session_id": None})
+    # A second worker loads the same version into its own memory.
+    monkeypatch.setattr(chat_sessions, "_memory", LRUCache(100, 1 << 20, 60))
+    second = chat_sessions.open_session({"session_id": first.id})
+    assert second is not first and second.version == first.version
+
+    _, one = first.render("chat_general", "from worker one")
+    _, two = second.render("chat_general", "from worker two")
+    first.record(one, "answer one")
+    second.record(two, "answer two")
+
+    monkeypatch.setattr(chat_sessions, "_memory", LRUCache(100, 1 << 20, 60))
+    stored = chat_sessions.open_session({"session_id": first.id})
+    assert [turn[:2] for turn in stored.conversation.turns] == [
+        ("from worker one", "answer one"),
+        ("from worker two", "answer two"),
+    ]
+    assert chat_sessions.stats()["conflicts"] >= 1
+
+
+def test_regenerate_matches_long_messages():
+    message = "explain this stack trace " * 400
+    session = chat_sessions.open_session({"session_id": None})
+    _, pending = session.render("chat_general", message)
+    session.record(pending, "first try")
+    assert session.conversation.turns[-1][0] != message
+
+    _, pending = session.render("chat_general", message, regenerate=True)
+    assert session.conversation.turns == []
+    session.record(pending, "second try")
+    assert [turn[1] for turn in session.conversation.turns] == ["second try"]
+    assert session.conversation.ends_with(message)
+    assert not session.conversation.ends_with(message[:chat_context.MAX_TURN_TOKENS * 4])
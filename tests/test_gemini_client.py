@@ -0,0 +1,61 @@
+import pytest
+
+import fake_gemini
+import gemini_client
+
+PAYLOAD = {"contents": [{"role": "user", "parts": [{"text": "hello"}]}]}
+
+
+@pytest.fixture
+def fresh_session(monkeypatch):
+    """A new pooled session, without retry backoff, for this test only."""
+    monkeypatch.setattr(gemini_client, "BACKOFF_FACTOR", 0.0)
+    monkeypatch.setattr(gemini_client, "_session", None)
+    monkeypatch.setattr(gemini_client, "_session_pid", None)
+
+
+def _calls(server) -> int:
+    return server.RequestHandlerClass.counters.snapshot()["generate"]
+
+
+def test_connections_are_reused(fake_server, fresh_session):
+    url = fake_gemini.base_url(fake_server)
+    for _ in range(5):
+        response = gemini_client.post(url, PAYLOAD)
+        assert response.status_code == 200
+        assert gemini_client.candidate_text(response.json())
+
+    stats = gemini_client.pool_stats()
+    assert stats["requests"] == 5
+    assert stats["misses"] == 1
+    assert stats["hits"] == 4
+
+
+def test_failed_calls_are_retried_on_the_pool(fake_server, fake_settings, fresh_session):
+    fake_settings.error_rate = 1.0
+    before = _calls(fake_server)
+
+    response = gemini_client.post(fake_gemini.base_url(fake_server), PAYLOAD)
+
+    assert response.status_code == 500
+    assert _calls(fake_server) - before == 1 + gemini_client.MAX_RETRIES
+    assert gemini_client.pool_stats()["misses"] == 1
+
+
+def test_upstream_stats_count_errors(fake_server, fake_settings, fresh_session, monkeypatch):
+    monkeypatch.setattr(gemini_client, "_stats", gemini_client.UpstreamStats(10))
+    url = fake_gemini.base_url(fake_server)
+    gemini_client.post(url, PAYLOAD)
+    fake_settings.error_rate = 1.0
+    gemini_client.post(url, PAYLOAD)
+
+    stats = gemini_client.upstream_stats()
+    assert stats["window"] == 2
+    assert stats["error_rate"] == 0.5
+
+
+def test_stream_url_yields_sse_events(fake_server, fresh_session):
+    url = gemini_client.stream_url(fake_gemini.base_url(fake_server))
+    response = gemini_client.post(url, PAYLOAD, stream=True)
+    text = "".join(gemini_client.candidate_text(event) for event in gemini_client.iter_sse(response))
+    assert len(text.split()) == 20
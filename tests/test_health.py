@@ -0,0 +1,18 @@
+def test_health_status(client):
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "healthy"
+    assert "gemini_pool" in body
+
+
+def test_liveness(client):
+    response = client.get("/api/health/live")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "alive"
+
+
+def test_readiness(client):
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.get_json()["status"] in ("starting", "ready")
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import image_pipeline
+import site_build
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def image_root(tmp_path, monkeypatch):
+    images = tmp_path / "images"
+    images.mkdir()
+    Image.new("RGB", (1200, 600), "navy").save(images / "hero.png")
+    monkeypatch.setattr(image_pipeline, "ROOT", str(tmp_path))
+    monkeypatch.setattr(image_pipeline, "IMAGES_DIR", str(images))
+    monkeypatch.setattr(image_pipeline, "OUT_DIR", str(images / "optimized"))
+    monkeypatch.setattr(image_pipeline, "MANIFEST", str(images / "optimized" / "manifest.json"))
+    return tmp_path
+
+
+def test_changed_widths_rebuild(image_root, capsys):
+    image_pipeline.build(widths=(480,), workers=1)
+    image_pipeline.build(widths=(480, 960), workers=1)
+    manifest = image_pipeline.build(widths=(480, 960), workers=1)
+
+    runs = [line for line in capsys.readouterr().out.splitlines() if "to build" in line]
+    assert [line.split(", ")[1].split()[0] for line in runs] == ["1", "1", "0"]
+    entry = manifest["images/hero.png"]
+    assert entry["widths"] == [480, 960]
+    assert {v["width"] for v in entry["variants"]} == {480, 960}
+    assert all(os.path.exists(image_root / v["file"]) for v in entry["variants"])
+
+
+def test_srcset_lists_every_variant_width(image_root, monkeypatch):
+    image_pipeline.build(widths=(480, 960), workers=1)
+    monkeypatch.setattr(site_build, "ROOT", str(image_root))
+    sizes = site_build.ImageSizes()
+
+    page = site_build.optimize_images('<img src="/images/first.png"><img src="images/hero.png">', "index.html", sizes)
+
+    assert 'width="1200" height="600"' in page
+    assert (
+        'srcset="images/hero.png?w=480 480w, images/hero.png?w=960 960w, images/hero.png?w=1200 1200w"'
+        in page
+    )
+    assert 'sizes="100vw"' in page
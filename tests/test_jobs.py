@@ -0,0 +1,41 @@
+import time
+
+import admission
+import jobs
+
+
+def _wait_for(job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    return jobs.get(job_id)
+
+
+def test_jobs_hold_an_in_flight_lease(monkeypatch):
+    monkeypatch.setattr(admission, "ENABLED", True)
+    monkeypatch.setattr(admission, "_store", admission.MemoryStore())
+    monkeypatch.setattr(admission, "MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(jobs, "CAPACITY_RETRY", 0.05)
+    seen = []
+
+    def run_item(item):
+        seen.append(admission.stats()["in_flight"])
+        return {"success": True, "content": "done"}
+
+    held = admission.acquire()
+    job, created = jobs.submit({"tool": "hook", "input": "lease"}, run_item)
+    assert created
+    time.sleep(0.3)
+    assert jobs.get(job["id"])["status"] == jobs.QUEUED
+    assert jobs.stats()["capacity_waits"] >= 1
+
+    admission.release(held)
+    assert _wait_for(job["id"], (jobs.DONE, jobs.FAILED))["status"] == jobs.DONE
+    assert seen == [1]
+    deadline = time.monotonic() + 1
+    while admission.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert admission.stats()["in_flight"] == 0
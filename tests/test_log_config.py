@@ -0,0 +1,85 @@
+import json
+import logging
+import sys
+
+import pytest
+import requests
+
+import log_config
+import resilience
+
+KEY = "test-key"
+
+
+def _record(message, *args, exc_info=None, **extra):
+    record = logging.LogRecord("app", logging.ERROR, __file__, 1, message, args, exc_info)
+    record.request_id = "rid"
+    record.__dict__.update(extra)
+    return record
+
+
+def test_redact_hides_the_key_in_urls_and_raw_text():
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/x:generateContent?key={KEY}"
+    assert log_config.redact(url).endswith("?key=[REDACTED]")
+    assert log_config.redact("key=AIzaSyA-other_key1 used") == "key=[REDACTED] used"
+    assert KEY not in log_config.redact(f"Authorization failed for {KEY}!")
+
+
+def _exc_info(message):
+    try:
+        raise requests.exceptions.ConnectionError(message)
+    except requests.exceptions.ConnectionError:
+        return sys.exc_info()
+
+
+@pytest.mark.parametrize("formatter", [log_config.RedactingFormatter("%(message)s"), log_config.JsonFormatter()])
+def test_formatters_redact_messages_fields_and_tracebacks(formatter):
+    record = _record(
+        "calling %s", f"?key={KEY}", exc_info=_exc_info(f"Max retries exceeded with url: /x?key={KEY}"),
+        upstream_url=f"https://example.test/?key={KEY}",
+    )
+    line = formatter.format(record)
+    assert KEY not in line
+    assert "[REDACTED]" in line
+    if isinstance(formatter, log_config.JsonFormatter):
+        entry = json.loads(line)
+        assert "ConnectionError" in entry["exc"]
+        assert entry["request_id"] == "rid"
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ConnectionError(f"Max retries exceeded with url: /x?key={KEY}"),
+    RuntimeError(f"unexpected reply for key {KEY}"),
+])
+def test_error_replies_to_clients_are_redacted(client, monkeypatch, error):
+    def fail(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(resilience, "post", fail)
+    response = client.post("/api/generate", json={"tool": "hook", "input": f"redaction {type(error).__name__}"})
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert KEY not in body
+    assert "[REDACTED]" in body
+
+    response = client.post("/api/chat/stream", json={"tool": "chat_general", "message": "redacted stream"})
+    body = response.get_data(as_text=True)
+    assert "event: error" in body
+    assert KEY not in body
+
+
+def test_payload_bodies_are_only_logged_when_sampled(monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    data = {"candidates": [{"content": {"parts": [{"text": "hi"}]}}]}
+
+    monkeypatch.setattr(log_config, "PAYLOAD_SAMPLE_RATE", 0.0)
+    log_config.log_upstream("hook", 200, 0.25, data)
+    assert [r.getMessage() for r in caplog.records] == ["Gemini response status: 200"]
+    assert caplog.records[0].upstream_ms == 250
+
+    caplog.clear()
+    monkeypatch.setattr(log_config, "PAYLOAD_SAMPLE_RATE", 1.0)
+    log_config.log_upstream("hook", 200, 0.25, data)
+    assert len(caplog.records) == 2
+    assert caplog.records[1].sampled is True
+    assert "candidates" in caplog.records[1].getMessage()
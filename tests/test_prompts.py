@@ -0,0 +1,87 @@
+import json
+import os
+import re
+
+import pytest
+
+import app
+import prompts
+
+DOC = {
+    "version": 1,
+    "templates": {
+        "hook": {"system": "You write hooks.", "template": "Hook for: {input}"},
+        "convert": {"system": "You convert code.", "template": "Convert to {target}:\n\n{input}"},
+    },
+    "profiles": {"test": {"tools": ["hook", "convert"], "defaults": {"generation": {"temperature": 0.5}}}},
+}
+
+
+def _write(path, doc):
+    path.write_text(json.dumps(doc), encoding="utf-8")
+
+
+@pytest.fixture
+def templates_file(tmp_path):
+    path = tmp_path / "prompt_templates.json"
+    _write(path, DOC)
+    return path
+
+
+def test_render_and_options(templates_file):
+    registry = prompts.TemplateRegistry("test", str(templates_file))
+    assert registry["convert"].render("print(1)", "Go") == "Convert to Go:\n\nprint(1)"
+    assert registry["convert"].render("print(1)", 5) == "Convert to 5:\n\nprint(1)"
+    assert registry["convert"].render("print(1)", None) == "Convert to None:\n\nprint(1)"
+    assert registry.options("hook") == {"generationConfig": {"temperature": 0.5}}
+    assert registry.user_text("You write hooks.", "x") == "You write hooks.\n\nUser: x"
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"system": "s"}, "missing 'template'"),
+    ({"system": "s", "template": "no placeholder"}, "no {input} placeholder"),
+    ({"system": "s", "template": "{input} {other}"}, "unsupported placeholder {other}"),
+    ({"system": "s", "template": "{input!r}"}, "unsupported placeholder {input}"),
+    ({"system": "s", "template": "{input}", "grounding": "yes"}, "grounding must be true or false"),
+    ({"system": "s", "template": "{input}", "generation": {"seed": 1}}, "unsupported generation settings"),
+])
+def test_invalid_templates_are_rejected(templates_file, spec, message):
+    doc = json.loads(json.dumps(DOC))
+    doc["templates"]["hook"] = spec
+    _write(templates_file, doc)
+    with pytest.raises(prompts.TemplateError, match=re.escape(message)):
+        prompts.TemplateRegistry("test", str(templates_file))
+
+
+def test_profile_with_unknown_tool_is_rejected(templates_file):
+    doc = json.loads(json.dumps(DOC))
+    doc["profiles"]["test"]["tools"].append("missing")
+    _write(templates_file, doc)
+    with pytest.raises(prompts.TemplateError, match="unknown tool 'missing'"):
+        prompts.TemplateRegistry("test", str(templates_file))
+
+
+def test_hot_reload_keeps_last_good_templates(templates_file, monkeypatch):
+    monkeypatch.setattr(prompts, "RELOAD_INTERVAL", 0)
+    registry = prompts.TemplateRegistry("test", str(templates_file))
+    version = registry["hook"].version
+
+    doc = json.loads(json.dumps(DOC))
+    doc["templates"]["hook"]["template"] = "Punchier hook for: {input}"
+    _write(templates_file, doc)
+    os.utime(templates_file, ns=(0, registry._mtime + 1))
+    assert registry["hook"].render("tea", "") == "Punchier hook for: tea"
+    assert registry["hook"].version != version
+
+    doc["templates"]["hook"]["template"] = "no placeholder"
+    _write(templates_file, doc)
+    os.utime(templates_file, ns=(0, registry._mtime + 2))
+    assert registry["hook"].render("tea", "") == "Punchier hook for: tea"
+
+
+@pytest.mark.parametrize("target", [5, None])
+def test_non_string_target_is_accepted(target):
+    client = app.app.test_client()
+    response = client.post("/api/generate", json={"tool": "convert", "input": "print(1)", "target": target})
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
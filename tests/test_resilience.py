@@ -0,0 +1,67 @@
+import time
+
+import fake_gemini
+import prompts
+import resilience
+
+PAYLOAD = {"contents": [{"role": "user", "parts": [{"text": "hello"}]}]}
+
+
+def test_rate_limits_do_not_open_the_circuit(fake_server, fake_settings, monkeypatch):
+    breaker = resilience.CircuitBreaker()
+    monkeypatch.setattr(resilience, "_breaker", breaker)
+    monkeypatch.setitem(resilience.TOOL_DEADLINES, "blog", 0.5)
+    fake_settings.rate_limit_rate = 1.0
+
+    for _ in range(resilience.CIRCUIT_MIN_CALLS + 2):
+        response = resilience.post(fake_gemini.base_url(fake_server), PAYLOAD, tool_id="blog")
+        assert response.status_code == 429
+
+    assert breaker.state == resilience.CLOSED
+    assert breaker.snapshot()["window"] == 0
+
+
+def test_outages_open_the_circuit():
+    breaker = resilience.CircuitBreaker()
+    for _ in range(resilience.CIRCUIT_MIN_CALLS):
+        breaker.record(False, 0.1)
+    assert breaker.state == resilience.OPEN
+
+
+def test_rate_limited_probe_frees_its_slot():
+    breaker = resilience.CircuitBreaker()
+    breaker.state = resilience.HALF_OPEN
+    assert breaker.allow() is True
+    breaker.record(None, 0.1, probe=True)
+    assert breaker.state == resilience.HALF_OPEN
+    assert breaker.snapshot()["window"] == 0
+
+
+def test_retries_stop_at_the_deadline(fake_server, fake_settings):
+    fake_settings.error_rate = 1.0
+    url = fake_gemini.base_url(fake_server)
+
+    started = time.monotonic()
+    response = resilience.gemini_client.post(url, PAYLOAD, timeout=0.5)
+    assert response.status_code == 500
+    assert time.monotonic() - started < 0.5
+
+
+def test_long_output_tools_get_the_long_deadline():
+    gyra, tools = prompts.load("gyra"), prompts.load("tools")
+    for tool_id in ("notes", "quiz", "code_gen", "sql", "seo", "chat_general", "chat_dev"):
+        payload = {"contents": [], **gyra.options(tool_id)}
+        assert resilience.deadline(tool_id, payload) >= 60
+    assert resilience.deadline("hook", {"contents": [], **tools.options("hook")}) == resilience.DEADLINES["short"]
+
+
+def test_slow_calls_are_measured_against_their_own_deadline():
+    breaker = resilience.CircuitBreaker()
+    for _ in range(resilience.CIRCUIT_MIN_CALLS * 2):
+        breaker.record(True, 30, timeout=60)
+    assert breaker.state == resilience.CLOSED
+
+    breaker = resilience.CircuitBreaker()
+    for _ in range(resilience.CIRCUIT_MIN_CALLS):
+        breaker.record(True, 9.5, timeout=10)
+    assert breaker.state == resilience.OPEN
@@ -0,0 +1,76 @@
+import prompts
+import response_cache
+from response_cache import LRUCache, ResponseCache, SQLiteCache
+
+
+def _template(**spec):
+    return prompts.Template("convert", {"system": "s", "template": "To {target}: {input}", **spec})
+
+
+def test_inputs_are_normalized():
+    key = response_cache.make_key("hook", "  Coffee\n  TIPS ", "Python", "v1")
+    assert key == response_cache.make_key("hook", "coffee tips", "Python", "v1")
+    assert key != response_cache.make_key("hook", "coffee tips", "Go", "v1")
+    assert key != response_cache.make_key("hook", "coffee tips", "Python", "v2")
+
+
+def test_template_keys():
+    assert response_cache.template_key("convert", _template(cache=False), "x", "Go") is None
+
+    hook = prompts.Template("hook", {"system": "s", "template": "Hook: {input}"})
+    assert response_cache.template_key("hook", hook, "x", "Go") == response_cache.template_key("hook", hook, "x", "Rust")
+    convert = _template()
+    assert response_cache.template_key("convert", convert, "x", "Go") != response_cache.template_key(
+        "convert", convert, "x", "Rust"
+    )
+    grounded = response_cache.template_key("convert", _template(grounding=True), "x", "Go")
+    assert grounded.startswith(response_cache.GROUNDED_PREFIX)
+
+
+def test_entries_expire():
+    cache = LRUCache(10, 1000, ttl=60)
+    cache.set("fresh", "a")
+    cache.set("stale", "b", ttl=-1)
+    assert cache.get("fresh") == "a"
+    assert cache.get("stale") is None
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_count_and_size():
+    cache = LRUCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.set("a", "a", 4)
+    cache.set("b", "b", 4)
+    cache.get("a")
+    cache.set("c", "c", 4)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("a", None, "c")
+
+    cache.set("d", "d", 8)
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.bytes == 8
+    cache.set("huge", "x", 11)
+    assert cache.get("huge") is None and cache.get("d") == "d"
+
+
+def test_shared_disk_layer_fills_memory(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl=60)
+    ResponseCache(LRUCache(10, 1000, 60), disk).set("k", "value")
+
+    other_worker = ResponseCache(LRUCache(10, 1000, 60), disk)
+    assert other_worker.get("k") == "value"
+    assert other_worker.get("k") == "value"
+    assert other_worker.get("missing") is None
+    stats = other_worker.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_grounded_answers_use_their_own_cache(monkeypatch):
+    plain = ResponseCache(LRUCache(10, 1000, 60))
+    grounded = ResponseCache(LRUCache(10, 1000, 60))
+    monkeypatch.setattr(response_cache, "_cache", plain)
+    monkeypatch.setattr(response_cache, "_grounded_cache", grounded)
+
+    key = response_cache.template_key("convert", _template(grounding=True), "x", "Go")
+    response_cache.put(key, "from the web")
+    assert response_cache.get(key) == "from the web"
+    assert len(grounded.memory) == 1 and len(plain.memory) == 0
+    assert response_cache.stats()["grounded"]["memory_hits"] == 1
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+import singleflight
+
+
+def _callers(group, key, fn, count):
+    """Start ``count`` callers of ``fn`` under ``key``; return their threads and outcomes."""
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(group.do(key, fn))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def _wait_for_followers(group, count):
+    for _ in range(500):
+        if group.coalesced >= count:
+            return
+        time.sleep(0.01)
+
+
+def test_concurrent_callers_share_one_call():
+    group = singleflight.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    threads, outcomes = _callers(group, "k", fn, 5)
+    _wait_for_followers(group, 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes == ["answer"] * 5
+    assert len(calls) == 1
+    assert group.stats() == {"in_flight": 0, "upstream_calls": 1, "coalesced": 4}
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    group = singleflight.SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    threads, outcomes = _callers(group, "k", fail, 3)
+    _wait_for_followers(group, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(outcomes) == 3
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    with pytest.raises(RuntimeError):
+        group.do("k", fail)
+    assert group.do("k", lambda: "recovered") == "recovered"
+
+
+def test_prompt_key_covers_system_message():
+    assert singleflight.prompt_key("p", "a") != singleflight.prompt_key("p", "b")
+    assert singleflight.prompt_key("p", "a") == singleflight.prompt_key("p", "a")
@@ -0,0 +1,68 @@
+"""One pass over the main routes of both apps against the fake Gemini."""
+import time
+
+from gemini_client import UPSTREAM_ERRORS
+
+
+def _ok(response, status=200) -> dict:
+    assert response.status_code == status, response.get_data(as_text=True)
+    body = response.get_json()
+    assert body["success"] is True
+    return body
+
+
+def test_generate(client):
+    body = _ok(client.post("/api/generate", json={"tool": "hook", "input": "morning routines"}))
+    assert body["content"] and not body["content"].startswith(UPSTREAM_ERRORS)
+
+
+def test_unknown_tool_is_rejected(client):
+    response = client.post("/api/generate", json={"tool": "nope", "input": "x"})
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_chat(client):
+    body = _ok(client.post("/api/chat", json={"tool": "chat_general", "message": "hello"}))
+    assert body["response"] and not body["response"].startswith(UPSTREAM_ERRORS)
+
+
+def test_generate_stream(client):
+    response = client.post("/api/generate/stream", json={"tool": "hook", "input": "sleep tips"})
+    assert response.status_code == 200
+    assert "event: done" in response.get_data(as_text=True)
+
+
+def test_batch(client):
+    items = [{"tool": "hook", "input": "coffee"}, {"tool": "hook", "input": "tea"}]
+    body = _ok(client.post("/api/generate/batch", json={"items": items}))
+    assert [result["success"] for result in body["results"]] == [True, True]
+
+
+def test_job_runs_to_completion(client):
+    response = client.post("/api/jobs", json={"tool": "hook", "input": "a job about gardening"})
+    assert response.status_code in (200, 202)
+    location = response.headers.get("Location") or f"/api/jobs/{response.get_json()['job']['id']}"
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = _ok(client.get(location))["job"]
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "done"
+    assert job["result"]["success"] is True
+
+
+def test_static_page(client):
+    response = client.get("/about", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/html"
+    assert response.headers["ETag"]
+
+
+def test_metrics(client):
+    client.post("/api/generate", json={"tool": "hook", "input": "metrics"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert b"gemini" in response.data
@@ -0,0 +1,39 @@
+import sqlite3
+import threading
+
+import sqlite_db
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+
+
+def test_threads_share_one_connection(tmp_path):
+    db = sqlite_db.Database(str(tmp_path / "state.db"), SCHEMA)
+    db.execute("INSERT INTO counters VALUES ('hits', 0)")
+
+    def bump():
+        for _ in range(20):
+            with db.transaction() as conn:
+                conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'hits'")
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert db.execute("SELECT value FROM counters") == [(160,)]
+    assert db.opened == 1
+
+
+def test_waits_for_another_process_write_lock(tmp_path):
+    path = str(tmp_path / "state.db")
+    db = sqlite_db.Database(path, SCHEMA)
+    db.execute("INSERT INTO counters VALUES ('hits', 0)")
+
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.1, other.execute, ("COMMIT",)).start()
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE counters SET value = 1")
+    assert db.execute("SELECT value FROM counters") == [(1,)]
@@ -0,0 +1,18 @@
+import static_assets
+
+
+def test_workers_only_read_precompressed_variants(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "page.html").write_text("<p>hello</p>\n" * 500)
+    monkeypatch.setattr(static_assets, "CACHE_DIR", str(tmp_path / "cache"))
+
+    # A worker indexes without compressing anything itself...
+    assert static_assets.index_site(str(site))["page.html"].variants == {}
+    assert not [p for p in (tmp_path / "cache").iterdir() if p.suffix in (".gz", ".br")]
+
+    # ...and picks up the variants once the master has built them.
+    static_assets.index_site(str(site), precompress=True)
+    variants = static_assets.index_site(str(site))["page.html"].variants
+    assert "gzip" in variants
+    assert variants["gzip"][1] < (site / "page.html").stat().st_size
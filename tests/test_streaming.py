@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/generate/stream", "/api/chat/stream"])
+def test_bad_body_returns_json_error(client, path):
+    response = client.post(path, data="[]", content_type="application/json")
+    assert response.status_code == 500
+    assert response.get_json()["success"] is False
+
+
+def test_chat_stream_sends_text_then_done(client):
+    response = client.post("/api/chat/stream", json={"tool": "chat_general", "message": "hi there"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+    assert "data:" in body
+    assert "event: done" in body